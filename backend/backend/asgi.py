@@ -12,6 +12,10 @@ def get_ws_urlpatterns():
     from codes.routing import websocket_urlpatterns
     return websocket_urlpatterns
 
+def get_lifespan():
+    from codes.lifespan import Lifespan
+    return Lifespan()
+
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),     # do django's usual stuff for http requests
     "websocket": JWTAuthMiddleware(
@@ -19,4 +23,5 @@ application = ProtocolTypeRouter({
             get_ws_urlpatterns()        # for websockets, check if they are authenticated, then route them to their respective room
         )
     ),
+    "lifespan": get_lifespan(),         # worker startup/shutdown under uvicorn (see serve.sh), after http so django is set up
 })
@@ -0,0 +1,76 @@
+from functools import wraps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+# DRF views always run in daphne's sync thread pool. These helpers let the hot read-only endpoints be plain
+# async Django views instead, with the same JWT auth and throttle rates as the DRF ones (see ASYNC_API_VIEWS)
+
+User = get_user_model()
+
+async def authenticate_jwt(request):
+    """Returns the user for the request's Bearer token, or None"""
+    header = request.headers.get("Authorization", "")
+    parts = header.split()
+    if len(parts) != 2 or parts[0] not in jwt_settings.AUTH_HEADER_TYPES:
+        return None
+
+    try:
+        token = AccessToken(parts[1])
+    except TokenError:
+        return None
+
+    try:
+        return await User.objects.aget(**{jwt_settings.USER_ID_FIELD: token[jwt_settings.USER_ID_CLAIM]}, is_active=True)
+    except (User.DoesNotExist, KeyError):
+        return None
+
+async def _allow_request(throttle, request):
+    """SimpleRateThrottle.allow_request with the async cache, same keys and history so both kinds of views share a budget"""
+    if throttle.rate is None:
+        return True
+    key = throttle.get_cache_key(request, None)
+    if key is None:
+        return True
+
+    now = throttle.timer()
+    history = [t for t in await throttle.cache.aget(key, []) if t > now - throttle.duration]
+    if len(history) >= throttle.num_requests:
+        return False
+    history.insert(0, now)
+    await throttle.cache.aset(key, history, throttle.duration)
+    return True
+
+async def is_throttled(request):
+    """Runs DRF's throttle classes (DEFAULT_THROTTLE_CLASSES), a request counts against the same budget on either kind of view"""
+    for throttle_class in drf_settings.DEFAULT_THROTTLE_CLASSES:
+        if not await _allow_request(throttle_class(), request):
+            return True
+    return False
+
+def async_api_view(methods, auth_required=True):
+    """Decorator for async views: checks the method, authenticates the JWT and applies throttling"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+
+            user = await authenticate_jwt(request)
+            if auth_required and user is None:
+                return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+            request.user = user or AnonymousUser()
+
+            if await is_throttled(request):
+                return JsonResponse({"detail": "Request was throttled."}, status=429)
+
+            return await view(request, *args, **kwargs)
+
+        # Like DRF, these only use token auth, so there's no CSRF to check
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
@@ -18,4 +18,13 @@ app.conf.beat_schedule = {
         "task": "codes.tasks.snapshot_active_projects",
         "schedule": settings.AUTO_SAVE_INTERVAL,
     },
+    # deletes get queued right away, this just catches anything a crashed worker left behind
+    "purge-deleted-rows": {
+        "task": "projects.tasks.purge_deleted",
+        "schedule": settings.PURGE_INTERVAL,
+    },
+    "refresh-google-jwks": {
+        "task": "users.tasks.refresh_google_jwks",
+        "schedule": settings.GOOGLE_JWKS_REFRESH_INTERVAL,
+    },
 }
\ No newline at end of file
@@ -0,0 +1,41 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+
+# Reads only go to the replica when the code asks for it with read_replica(). Routing every read there would
+# break read-your-writes (create a project, then list it), so we opt in for the reads that can handle a bit of lag.
+# It's a contextvar so it follows the request into sync_to_async threads and the async ORM
+
+_use_replica = ContextVar("use_replica", default=False)
+
+def replica_configured():
+    return "replica" in settings.DATABASES
+
+@contextmanager
+def read_replica():
+    """Sends the reads inside this block to the replica (if there is one)"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or not replica_configured():
+            return None
+        # Inside a transaction we have to read our own writes
+        if connections["default"].in_atomic_block:
+            return None
+        return "replica"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
@@ -1,9 +1,12 @@
 import jwt
+import logging
 from urllib.parse import parse_qs
 from django.conf import settings
 from channels.db import database_sync_to_async
 from django.core.signing import TimestampSigner, BadSignature, SignatureExpired
 
+logger = logging.getLogger(__name__)
+
 # Fetch the user from the database
 @database_sync_to_async
 def get_user(user_id):
@@ -43,11 +46,11 @@ class JWTAuthMiddleware:
             scope['user'] = await self.get_user_from_jwt(token)
 
         if share_token and ":" in share_token:
-            share_data = await self.validate_share_token(share_token)
+            share_data = self.validate_share_token(share_token)
             if share_data:
                 # Add the share data to scope so consumers can use it
                 scope['share_context'] = share_data
-                print(f"Share Token Validated: {share_data}")
+                logger.debug("share token validated", extra={"event": "ws.share_token", "share_data": share_data})
 
         return await self.inner(scope, receive, send)
 
@@ -58,14 +61,15 @@ class JWTAuthMiddleware:
             user_id = payload.get("user_id")
             return await get_user(user_id)
         except (jwt.ExpiredSignatureError, jwt.DecodeError, jwt.InvalidTokenError) as e:
-            print(f"JWT Error: {e}")
+            logger.info("jwt rejected", extra={"event": "ws.jwt_rejected", "error": str(e)})
             from django.contrib.auth.models import AnonymousUser
             return AnonymousUser()
-        except Exception as e:
-            print(f"Generic JWT Error: {e}")
+        except Exception:
+            logger.exception("unexpected jwt error", extra={"event": "ws.jwt_error"})
+            from django.contrib.auth.models import AnonymousUser
             return AnonymousUser()
 
-    @database_sync_to_async
+    # Just checks a signature, no need to hop to a thread for it
     def validate_share_token(self, token_string):
         """
         Validates the share_token using Django's TimestampSigner.
@@ -77,8 +81,8 @@ class JWTAuthMiddleware:
             original_data = signer.unsign_object(token_string) 
             return original_data
         except SignatureExpired:
-            print("Share link expired")
+            logger.info("share link expired", extra={"event": "ws.share_token_rejected", "reason": "expired"})
             return None
         except BadSignature:
-            print("Invalid share link signature")
+            logger.info("invalid share link signature", extra={"event": "ws.share_token_rejected", "reason": "bad_signature"})
             return None
\ No newline at end of file
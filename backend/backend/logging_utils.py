@@ -0,0 +1,134 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging setup (see LOGGING in settings). Records get filtered and tagged on the thread that logs them, then a
+# background thread formats them as JSON and writes them out, so a log line never blocks the event loop on stdout
+
+_log_context = ContextVar("log_context", default={})
+
+def bind_log_context(**fields):
+    """Adds fields (conn_id, room, ...) to every log line from the current task/thread from now on"""
+    _log_context.set({**_log_context.get(), **fields})
+
+class ContextFilter(logging.Filter):
+    """Copies the bound context onto the record, it has to run before the record leaves the thread"""
+
+    def filter(self, record):
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+class SampleFilter(logging.Filter):
+    """
+    Keeps a share of the noisy events (rates is {event: share kept}) and lets at most per_second of each event
+    through per second. Warnings and errors are never sampled, only rate limited.
+    The next line of an event that got through says how many were dropped before it.
+    """
+
+    def __init__(self, rates=None, per_second=None):
+        super().__init__()
+        self.rates = rates or {}
+        self.per_second = per_second
+        self._lock = threading.Lock()
+        self._windows = {}      # event -> [second, count, dropped]
+
+    def filter(self, record):
+        event = getattr(record, "event", record.msg)
+        if record.levelno < logging.WARNING:
+            rate = self.rates.get(event, 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+
+        if not self.per_second:
+            return True
+        second = int(time.monotonic())
+        with self._lock:
+            window = self._windows.get(event)
+            if window is None or window[0] != second:
+                dropped = window[2] if window else 0
+                window = self._windows[event] = [second, 0, dropped]
+            if window[1] >= self.per_second:
+                window[2] += 1
+                return False
+            window[1] += 1
+            if window[2]:
+                record.dropped = window[2]
+                window[2] = 0
+        return True
+
+# Everything a LogRecord has on its own, the rest came from extra= or the context
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class QueueLogHandler(QueueHandler):
+    """Puts records on a queue, a QueueListener thread formats them and writes them to stderr"""
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self._stream = stream
+        self._start_listener()
+        # Celery forks its workers after logging is set up, and the listener thread doesn't survive the fork
+        os.register_at_fork(after_in_child=self._start_listener)
+        atexit.register(self._stop_listener)
+
+    def prepare(self, record):
+        # QueueHandler's formats the record right here (on the event loop) and drops exc_info. All of that is the
+        # listener's JSONFormatter's job, so just copy it, exc_info, args and extras included
+        return copy.copy(record)
+
+    def _start_listener(self):
+        self.queue = queue.SimpleQueue()
+        target = logging.StreamHandler(self._stream or sys.stderr)
+        target.setFormatter(JSONFormatter())
+        self.listener = QueueListener(self.queue, target)
+        self.listener.start()
+
+    def _stop_listener(self):
+        # Writes out whatever is still queued
+        self.listener.stop()
+
+def log_span(logger, event, duration, level=logging.INFO, **fields):
+    logger.log(level, event, extra={"event": event, "duration_ms": round(duration * 1000, 2), **fields})
+
+@contextmanager
+def span(logger, event, level=logging.INFO, **fields):
+    """
+    Times the block and logs it as one line with duration_ms and status.
+    Yields the fields dict so the block can add to it (e.g. fields["saved"] = True)
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield fields
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        log_span(logger, event, time.perf_counter() - start, level, status=status, **fields)
@@ -0,0 +1,108 @@
+import time
+from collections import Counter
+from unittest import mock
+from asgiref.sync import async_to_sync
+from decouple import config
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import User
+from usergroups.models import Group
+from projects.models import Project
+from codes.models import Code
+
+# Query and wall time budgets for the REST endpoints, the users/usergroups/projects tests.py check theirs with this.
+# The budgets are (max queries, max wall time in ms). The query counts are what the endpoints make today, raise one only
+# on purpose (and say why in the PR). The wall times are loose on purpose, they're there to catch something going
+# quadratic, not a slow CI box (QUERY_BUDGET_TIME_FACTOR scales them)
+
+GROUPS, MEMBERS, PROJECTS = 50, 300, 500   # the checking user is in every group
+PASSWORD = "budget-check-password"
+TIME_FACTOR = config("QUERY_BUDGET_TIME_FACTOR", default=1.0, cast=float)
+
+# The listings get cached in a cache of the test's own, not the configured redis
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "query-budgets"}})
+class QueryBudgetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Only the checking user needs a usable password, hashing 300 of them would take minutes
+        cls.user = User.objects.create_user(email="budget_user@example.com", password=PASSWORD)
+        others = User.objects.bulk_create([
+            User(email=f"budget_{i}@example.com", password=make_password(None)) for i in range(MEMBERS - 1)
+        ])
+        cls.outsider = User.objects.create_user(email="budget_outsider@example.com")
+        members = [cls.user, *others]
+
+        groups = Group.objects.bulk_create([Group(owner=cls.user, group_name=f"budget group {i}") for i in range(GROUPS)])
+        Membership = Group.group_members.through
+        Membership.objects.bulk_create([Membership(group=g, user=m) for g in groups for m in members])
+
+        projects = Project.objects.bulk_create([
+            Project(project_name=f"project {i}", group=g) for g in groups for i in range(PROJECTS)
+        ])
+        Code.objects.bulk_create([
+            Code(project=p, content=f"name = input('name? ')\nprint('hello', name, {i})\n" * 10) for i, p in enumerate(projects)
+        ])
+        cls.group, cls.project = groups[0], projects[0]
+
+    def setUp(self):
+        cache.clear()
+        # 25 requests a minute wouldn't get us far
+        throttles = mock.patch.object(SimpleRateThrottle, "THROTTLE_RATES", {"user": None, "anon": None})
+        throttles.start()
+        self.addCleanup(throttles.stop)
+
+    def auth(self, user=None):
+        return {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(user or self.user).access_token}"}
+
+    def assertWithinBudget(self, budget, method, path, data=None, client=None, **extra):
+        """Makes the request and fails if it errors or goes over budget, listing the queries it made"""
+        max_queries, max_ms = budget
+        max_ms *= TIME_FACTOR
+        client = client or Client()
+        kwargs = {"content_type": "application/json"} if data is not None else {}
+
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data, **kwargs, **extra)
+            if response.streaming:
+                # The queries of a streamed response happen while it's being read
+                _read_stream(response)
+            elapsed = (time.perf_counter() - start) * 1000
+
+        # The test's transaction turns the views' atomic blocks into savepoints, those don't count
+        queries = [q["sql"] for q in ctx.captured_queries if not _is_savepoint(q["sql"])]
+        if response.status_code >= 400 or len(queries) > max_queries or elapsed > max_ms:
+            lines = [f"{method.upper()} {path}: {response.status_code}, {len(queries)} queries (budget {max_queries}), "
+                     f"{elapsed:.1f}ms (budget {max_ms:.0f}ms)"]
+            if response.status_code >= 400 and not response.streaming:
+                lines.append(f"response: {response.content[:300].decode(errors='replace')}")
+            lines += _describe_queries(queries)
+            self.fail("\n    ".join(lines))
+        return response
+
+def _describe_queries(queries):
+    # The same statement over and over is almost always an N+1, show those first
+    repeated = Counter(_shape(sql) for sql in queries)
+    lines = [f"{count}x {shape[:300]}" for shape, count in repeated.most_common() if count > 1]
+    return lines + [f"{i:>3}. {sql[:300]}" for i, sql in enumerate(queries, 1)]
+
+def _read_stream(response):
+    if not response.is_async:
+        return b"".join(response.streaming_content)
+
+    async def read():
+        return b"".join([chunk async for chunk in response.streaming_content])
+    return async_to_sync(read)()
+
+def _is_savepoint(sql):
+    return sql.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT"))
+
+def _shape(sql):
+    """The statement with its literals dropped, so the same query for different ids compares equal"""
+    return " ".join("?" if token.strip("'(),").isdigit() or token.startswith("'") else token for token in sql.split())
@@ -1,4 +1,7 @@
+import os
+import socket
 from pathlib import Path
+from copy import deepcopy
 from decouple import config
 from datetime import timedelta
 
@@ -18,6 +21,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     
     # Apps
     "users",
@@ -86,27 +90,110 @@ DATABASES = {
     }
 }
 
+# Connection pooling (psycopg 3). Every process keeps its own pool, sized for what that process does.
+# PROCESS_ROLE is set per service in docker compose: web (uvicorn), worker (celery) or beat (celery-beat).
+# Every uvicorn worker is its own process with its own pool, so the web service can hold WEB_CONCURRENCY x the web max
+PROCESS_ROLE = config("PROCESS_ROLE", default="web")
+DB_POOL_SIZES = {
+    "web": (2, 10),     # a worker runs sync views and the async ORM on one thread, plus the consumers' DB executor (see DB_EXECUTOR_WORKERS)
+    "worker": (1, 4),   # snapshots, clones and purges, one task at a time per child
+    "beat": (1, 2),     # only reads the schedule
+}
+if config("DB_POOL_ENABLED", default=True, cast=bool):
+    pool_min, pool_max = DB_POOL_SIZES.get(PROCESS_ROLE, DB_POOL_SIZES["web"])
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": config("DB_POOL_MIN_SIZE", default=pool_min, cast=int),
+            "max_size": config("DB_POOL_MAX_SIZE", default=pool_max, cast=int),
+            "timeout": config("DB_POOL_TIMEOUT", default=10, cast=int),    # seconds to wait for a free connection before erroring
+            "max_idle": 60 * 5,
+        }
+    }
+    # Django refuses persistent connections together with a pool, the pool already keeps them open
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+
+# Optional read replica. Only reads wrapped in read_replica() go there (see backend/db_routers.py), everything else
+# (writes, persist_ydoc_to_db, anything inside a transaction) stays on the primary
+POSTGRES_REPLICA_HOST = config("POSTGRES_REPLICA_HOST", default="")
+if POSTGRES_REPLICA_HOST:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": POSTGRES_REPLICA_HOST,
+        "PORT": config("POSTGRES_REPLICA_PORT", default=DATABASES["default"]["PORT"], cast=int),
+        "OPTIONS": deepcopy(DATABASES["default"].get("OPTIONS", {})),      # its own pool, same sizes
+        "TEST": {"MIRROR": "default"},      # tests see the primary's data through the replica alias
+    }
+
+DATABASE_ROUTERS = ["backend.db_routers.ReplicaRouter"]
+
 # Redis stuff; used as a broker for celery, channel layers, and also for caching active projects
 # I dockerized redis so its url is redis://redis:6379, putting it in an env file is quite overkill but eh it looks cleaner
 REDIS_HOST = config("REDIS_HOST", default="localhost")
 REDIS_PORT = config("REDIS_PORT", default=6379, cast=int)
+REDIS_DEFAULT_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
+
+# Every role can get its own redis, they all default to the one above. Even on the same server each role has its own
+# connections (sized below), so a celery backlog or a big doc read doesn't queue up behind the channel layer's blocking reads
+REDIS_DOCS_URL = config("REDIS_DOCS_URL", default=config("REDIS_URL", default=REDIS_DEFAULT_URL))   # ydocs, active sets, locks (codes/redis_helpers.py)
+REDIS_CHANNELS_URL = config("REDIS_CHANNELS_URL", default=REDIS_DEFAULT_URL)
+REDIS_CACHE_URL = config("REDIS_CACHE_URL", default=REDIS_DEFAULT_URL)
+REDIS_BROKER_URL = config("REDIS_BROKER_URL", default=REDIS_DEFAULT_URL)
+
+# Connection settings per role. The docs and cache pools block for up to "timeout" seconds when they're full instead of
+# erroring right away, and connections that sat idle get pinged before they're used again
+REDIS_POOLS = {
+    "docs": {"max_connections": config("REDIS_DOCS_MAX_CONNECTIONS", default=50, cast=int), "timeout": 5,
+             "socket_timeout": 5, "socket_connect_timeout": 2, "health_check_interval": 30},
+    "cache": {"max_connections": 20, "timeout": 2, "socket_timeout": 1, "socket_connect_timeout": 1, "health_check_interval": 30},
+    "broker": {"max_connections": 10, "socket_timeout": 5, "socket_connect_timeout": 2, "health_check_interval": 30},
+}
 
-# I'll probably add another redis cache for faster project and group querying, for now it seems fine tho
+# Used for the group/project listing cache (see usergroups/cache_helpers.py)
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/0",
-        "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        "LOCATION": REDIS_CACHE_URL,
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "SOCKET_TIMEOUT": REDIS_POOLS["cache"]["socket_timeout"],
+            "SOCKET_CONNECT_TIMEOUT": REDIS_POOLS["cache"]["socket_connect_timeout"],
+            "CONNECTION_POOL_CLASS": "redis.BlockingConnectionPool",
+            "CONNECTION_POOL_KWARGS": {
+                "max_connections": REDIS_POOLS["cache"]["max_connections"],
+                "timeout": REDIS_POOLS["cache"]["timeout"],
+                "health_check_interval": REDIS_POOLS["cache"]["health_check_interval"],
+            },
+        },
     }
 }
 
-CELERY_BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0" 
-CELERY_RESULT_BACKEND = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
+CELERY_BROKER_URL = REDIS_BROKER_URL
+CELERY_RESULT_BACKEND = REDIS_BROKER_URL
+CELERY_BROKER_POOL_LIMIT = REDIS_POOLS["broker"]["max_connections"]
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "socket_timeout": REDIS_POOLS["broker"]["socket_timeout"],
+    "socket_connect_timeout": REDIS_POOLS["broker"]["socket_connect_timeout"],
+    "health_check_interval": REDIS_POOLS["broker"]["health_check_interval"],
+}
+CELERY_REDIS_MAX_CONNECTIONS = REDIS_POOLS["broker"]["max_connections"]     # result backend
+CELERY_REDIS_SOCKET_TIMEOUT = REDIS_POOLS["broker"]["socket_timeout"]
+CELERY_REDIS_SOCKET_CONNECT_TIMEOUT = REDIS_POOLS["broker"]["socket_connect_timeout"]
+CELERY_REDIS_BACKEND_HEALTH_CHECK_INTERVAL = REDIS_POOLS["broker"]["health_check_interval"]
+
+# "core" is RedisChannelLayer (groups are sorted sets, messages go through lists), "pubsub" is RedisPubSubChannelLayer
+# (a group is a pub/sub channel, no per-connection group bookkeeping). Compare them with `manage.py bench_ws --layer`
+CHANNEL_LAYER_BACKENDS = {
+    "core": "channels_redis.core.RedisChannelLayer",
+    "pubsub": "channels_redis.pubsub.RedisPubSubChannelLayer",
+}
+CHANNEL_LAYER_BACKEND = config("CHANNEL_LAYER_BACKEND", default="core")
 
+# No socket_timeout or max_connections here: receives block on BZPOPMIN for a few seconds at a time,
+# and channels_redis' pools raise instead of waiting when they're full
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
-        "CONFIG": {"hosts": [(REDIS_HOST, REDIS_PORT)]},
+        "BACKEND": CHANNEL_LAYER_BACKENDS[CHANNEL_LAYER_BACKEND],
+        "CONFIG": {"hosts": [{"address": REDIS_CHANNELS_URL, "socket_connect_timeout": 2, "health_check_interval": 30}]},
     }
 }
 
@@ -133,6 +220,10 @@ REST_FRAMEWORK = {
     }
 }
 
+# Serve the hot read-only endpoints (group/project listings, share links, snippets) with native async views
+# instead of DRF's sync ones. Compare both with `python manage.py bench_api_views` before turning it on
+ASYNC_API_VIEWS = config("ASYNC_API_VIEWS", default=False, cast=bool)
+
 # JWT stuff
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -142,6 +233,15 @@ SIMPLE_JWT = {
     'UPDATE_LAST_LOGIN': True,
 }
 
+# Google login, ID tokens are verified locally against Google's signing keys (see users/google_auth.py)
+GOOGLE_CLIENT_ID = config("GOOGLE_CLIENT_ID", default="")      # tokens must be issued for this client, Google login is off without it
+GOOGLE_JWKS_SOURCE = config("GOOGLE_JWKS_SOURCE", default="https://www.googleapis.com/oauth2/v3/certs")  # URL or path to a JWKS file
+GOOGLE_JWKS_TIMEOUT = 5
+GOOGLE_JWKS_CACHE_TTL = 60 * 60 * 24        # keys stay cached this long, the refresh task renews them way before that
+GOOGLE_JWKS_REFRESH_INTERVAL = 60 * 60
+GOOGLE_JWKS_REFETCH_COOLDOWN = 60           # at most one refetch per minute for tokens signed with a key we don't know
+GOOGLE_TOKEN_LEEWAY = 30                    # seconds of clock skew we tolerate on exp/iat
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -160,6 +260,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Logging: JSON lines, written from a background thread (see backend/logging_utils.py)
+LOG_LEVEL = config("LOG_LEVEL", default="INFO")
+LOG_RATE_LIMIT = 50     # most lines per second of any one event, the rest get counted and dropped
+LOG_SAMPLE_RATES = {
+    "ws.receive": 0.01,     # one span per message would be way too much, keep 1% (it's DEBUG anyways)
+    "ws.membership": 0.1,
+}
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "context": {"()": "backend.logging_utils.ContextFilter"},
+        "sample": {"()": "backend.logging_utils.SampleFilter", "rates": LOG_SAMPLE_RATES, "per_second": LOG_RATE_LIMIT},
+    },
+    "handlers": {
+        "queue": {"()": "backend.logging_utils.QueueLogHandler", "filters": ["context", "sample"]},
+    },
+    "root": {"handlers": ["queue"], "level": LOG_LEVEL},
+    "loggers": {
+        "django": {"handlers": ["queue"], "level": "INFO", "propagate": False},
+    },
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -195,6 +318,48 @@ ACCOUNT_EMAIL_VERIFICATION = 'none'
 # App specific settings
 MAX_MESSAGE_SIZE = 1_000_000    # ~1MB
 HEARTBEAT_INTERVAL = 10         # how long we wait till we check if the user is still alive
+WS_SEND_QUEUE_RESYNC_AFTER = 200       # doc updates queued for one socket before they get swapped for a full sync (codes/outbound.py)
+WS_SEND_QUEUE_AWARENESS_BACKLOG = 20   # doc updates queued for one socket before its awareness frames get dropped
+WS_SEND_QUEUE_MAX_MESSAGES = 100       # chat/roster/voice frames queued for one socket, the oldest get dropped past this
+# Websocket messages per second (rate) with bursts up to burst, per connection and per room (room_rate/room_burst,
+# left out for types that only cost the sender), see codes/ratelimit.py. Types that aren't listed share "other"
+WS_RATE_LIMITS = {
+    "update": {"rate": 30, "burst": 100, "room_rate": 200, "room_burst": 600},          # typing, pastes and undos come in bursts
+    "awareness": {"rate": 15, "burst": 30, "room_rate": 100, "room_burst": 200},       # the client throttles these to 10/s
+    "chat_message": {"rate": 1, "burst": 5, "room_rate": 5, "room_burst": 20},
+    "voice_signal": {"rate": 20, "burst": 60, "room_rate": 100, "room_burst": 300},    # ICE candidates come all at once
+    "join_voice": {"rate": 0.5, "burst": 3, "room_rate": 5, "room_burst": 20},
+    "leave_voice": {"rate": 0.5, "burst": 3, "room_rate": 5, "room_burst": 20},
+    "request_sync": {"rate": 0.5, "burst": 5},
+    "ping": {"rate": 1, "burst": 5},
+    "other": {"rate": 2, "burst": 10},
+}
+WS_RATE_LIMIT_DELAYED = {"update"}     # held back instead of dropped, a dropped update would leave everyone's doc broken
+WS_RATE_LIMIT_MAX_DELAY = 2.0          # seconds an update can be held back, a connection further behind gets closed (4029) instead
+VIEWER_BATCH_INTERVAL = 0.1     # seconds of updates that go out to read-only viewers as one frame (see codes/viewers.py)
+LISTING_CACHE_TTL = 60 * 60     # cached group/project listings, they get invalidated by signals anyways so this can be long
+SNIPPET_CACHE_TTL = 60 * 60     # cached (precompressed) public snippets, also invalidated by signals
+SNIPPET_CACHE_MAX_AGE = 60      # how long browsers/nginx can reuse a snippet before revalidating it
+SEARCH_MIN_QUERY_LENGTH = 3     # trigram indexes can't help with anything shorter
+SEARCH_RESULT_LIMIT = 50
+EXPORT_CHUNK_SIZE = 200         # rows fetched per round trip when exporting a group as a zip
+CLONE_MAX_TARGETS = 1000        # most copies one clone request can make
+CLONE_ASYNC_THRESHOLD = 25      # clones bigger than this run in celery
+CLONE_BATCH_SIZE = 200          # rows per bulk_create when cloning
+TEXT_VIEW_TTL = 60 * 60 * 24          # the materialized text of a doc nobody edits expires after this, reads decode the ydoc again
+YDOC_TEMPLATE_TTL = 60 * 60 * 24 * 7   # how long clones can still pick up the source's ydoc before falling back to its code
+PURGE_BATCH_SIZE = 200          # rows deleted per transaction when purging deleted groups/projects
+PURGE_INTERVAL = 60 * 10        # how often celery-beat sweeps for deleted rows that weren't purged yet
+PURGE_LOCK_TIMEOUT = 60 * 10
+DB_EXECUTOR_WORKERS = config("DB_EXECUTOR_WORKERS", default=4, cast=int)    # threads the consumers run their DB calls on (codes/executors.py)
+DB_EXECUTOR_WAIT_WARNING = 1.0  # seconds a call can wait for one of those threads before we log it
+METRICS_TOKEN = config("METRICS_TOKEN", default="")     # /metrics wants it as a Bearer token, without one /metrics is off (unless DEBUG)
+ROOM_AFFINITY_ENABLED = config("ROOM_AFFINITY_ENABLED", default=False, cast=bool)  # one node owns each room's live doc (see codes/rooms.py)
+NODE_ID = f"{config('NODE_ID', default=socket.gethostname())}-{os.getpid()}"    # unique per server process, uvicorn workers included
+NODE_URL = config("NODE_URL", default="")   # ws base url that reaches this node directly, sent along with redirects (workers sharing a port can't have one)
+REDIS_CLUSTER = config("REDIS_CLUSTER", default=False, cast=bool)  # REDIS_URL is a Redis Cluster (the realtime doc store, see codes/redis_helpers.py)
+ACTIVE_PROJECTS_SHARDS = 16     # sets the active project list is split over, only change it along with a deploy (redis gets flushed)
+ROOM_LEASE_TTL = 30             # seconds a node keeps owning a room without renewing (it renews every third of that)
 USER_COLORS = [
   {"color": "#F06292", "light": "#F0629233"},
   {"color": "#BA68C8", "light": "#BA68C833"},
@@ -0,0 +1,40 @@
+import atexit
+import io
+import json
+import logging
+
+from django.test import SimpleTestCase
+
+from .logging_utils import QueueLogHandler
+
+
+class QueueLogHandlerTests(SimpleTestCase):
+    def _log(self, log):
+        stream = io.StringIO()
+        handler = QueueLogHandler(stream)
+        logger = logging.getLogger("backend.tests.queue_log")
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            log(logger)
+        finally:
+            logger.removeHandler(handler)
+            handler._stop_listener()
+            atexit.unregister(handler._stop_listener)
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def test_exception_keeps_its_traceback(self):
+        def log(logger):
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("it broke", extra={"event": "test.error"})
+
+        [entry] = self._log(log)
+        self.assertEqual(entry["msg"], "it broke")
+        self.assertEqual(entry["event"], "test.error")
+        self.assertIn("ValueError: boom", entry["exc"])
+
+    def test_message_args_are_formatted_by_the_listener(self):
+        [entry] = self._log(lambda logger: logger.warning("%s of %d", "one", 2))
+        self.assertEqual(entry["msg"], "one of 2")
@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
+from codes.views import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view),  # prometheus
 
     # app endpoints
     path("api/", include("users.urls")),
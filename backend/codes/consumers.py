@@ -1,8 +1,12 @@
 import json
 import base64
 import asyncio
+import logging
 import random
+import time
+import uuid
 import y_py as Y
+from collections import deque
 from urllib.parse import parse_qs
 
 # Superhero name generator for anonymous users
@@ -27,13 +31,26 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core import signing 
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from channels.db import database_sync_to_async
 from y_py import YDoc, apply_update
 
+from backend.logging_utils import bind_log_context, span, log_span
 from projects.models import Project
-from .redis_helpers import persist_ydoc_to_db, ydoc_key, active_set_key, voice_room_key, user_color_key, ACTIVE_PROJECTS_SET, ASYNC_REDIS
+from codes.models import Code
+from .executors import DB_EXECUTOR
+from . import control, metrics, ratelimit, rooms, viewers
+from .outbound import SendQueue
+from .redis_helpers import persist_ydoc_to_db, ydoc_key, set_text_view, active_set_key, voice_room_key, user_color_key, claim_cloned_ydoc, active_projects_shard, ASYNC_REDIS
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+def _decode(text_data):
+    """The message as a dict, or None if it isn't a JSON object"""
+    try:
+        msg = json.loads(text_data)
+    except Exception:
+        return None
+    return msg if isinstance(msg, dict) else None
 
 class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
 
@@ -42,7 +59,27 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
         self.project_id = int(self.scope["url_route"]["kwargs"]["project_id"])
         self.room = f"project_room_g{self.group_id}_p{self.project_id}"
         self.forced_disconnect = False
-
+        self.accepted = False
+        self.redirected = False
+        self.viewer = False         # read-only, joined with a view_link (see codes/viewers.py)
+        self.awaiting_doc = False   # the last sync we sent was the saved code, the room had no ydoc yet
+        self.local_room = None      # the room's in-memory doc, if this node owns the room (ROOM_AFFINITY_ENABLED)
+        # Everything we send goes through this once we've accepted (see codes/outbound.py)
+        self.outbox = SendQueue(self._send_text, self._sync_frame)
+        self.limiter = ratelimit.MessageLimiter(self.room)
+        self.held_back = deque()        # rate limited updates waiting for their turn, see receive
+        self.held_back_task = None
+
+        # Every log line from this connection carries these. Channels runs each consumer in its own task,
+        # so the context sticks for all of its handlers
+        self.conn_id = uuid.uuid4().hex[:12]
+        bind_log_context(conn_id=self.conn_id, room=self.room)
+
+        with span(logger, "ws.connect") as fields:
+            await self._connect()
+            fields["accepted"] = self.accepted
+
+    async def _connect(self):
         self.user = self.scope.get("user")
         self.is_anonymous = False
         self.anonymous_id = None
@@ -51,59 +88,120 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
         query_string = self.scope['query_string'].decode()
         params = parse_qs(query_string)
         share_token = params.get('share_token', [None])[0]
+        share_type = self._share_token_type(share_token, self.group_id, self.project_id)
+
+        if share_type == "view_link":
+            # Anyone with a view link watches read-only, members included, nobody needs a seat in the roster for it
+            self.viewer = True
+            bind_log_context(user=self.user.pk if self.user and self.user.is_authenticated else "viewer")
+            await self._connect_viewer()
+            return
 
         if not self.user or not self.user.is_authenticated:
             # Check if they have a valid share token for anonymous access
-            if not self._validate_share_token(share_token, self.group_id, self.project_id):
+            if share_type != "share_link":
+                logger.info("connection rejected", extra={"event": "ws.reject", "reason": "no_auth"})
                 await self.close(code=4001)
                 return
             # Anonymous user with valid share token - generate a superhero name!
             self.is_anonymous = True
             self.anonymous_id = f"anon_{generate_hero_name()}"
-            print(f"Anonymous user {self.anonymous_id} joining via share token")
+            bind_log_context(user=self.anonymous_id)
+            logger.info("anonymous user joining via share token", extra={"event": "ws.anonymous_join"})
         else:
             # Authenticated user - validate membership or share token
+            bind_log_context(user=self.user.pk)
             is_member = await self._validate_membership(self.user, self.group_id, self.project_id)
-            print(self.group_id, self.project_id, self.user.email, "is_member:", is_member)
+            logger.debug("membership checked", extra={"event": "ws.membership", "is_member": is_member})
             if not is_member:
-                if not self._validate_share_token(share_token, self.group_id, self.project_id):
-                    print(f"Connection rejected: User {self.user.email} is not a member and invalid token.")
+                if share_type != "share_link":
+                    logger.info("connection rejected", extra={"event": "ws.reject", "reason": "not_member"})
                     await self.close(code=4003)
                     return
 
+        if settings.ROOM_AFFINITY_ENABLED:
+            self.local_room, owner = await rooms.acquire_room(self.project_id, self)
+            # A client that already followed a redirect and still isn't on the owner (the proxy couldn't route it there)
+            # gets served from redis like before, rather than bouncing around
+            # Same when the owner never registered a NODE_URL, there's nowhere to send them
+            url = None if self.local_room or "node" in params else await rooms.node_url(owner)
+            if url:
+                await self.accept()
+                await self.redirect(owner, url)
+                return
+            if self.local_room is None:
+                logger.warning("redirected client missed the room owner", extra={"event": "room.affinity_miss", "owner": owner})
+
         # Connection Accepted
         await self.channel_layer.group_add(self.room, self.channel_name)
-        await self.channel_layer.group_add("global_connection_group", self.channel_name)
         await self.accept()
+        self.accepted = True
+        self.outbox.start()
+        control.register(self)
+        metrics.connection_opened(self.project_id)
 
         # Mark user active - use anonymous_id for anonymous users
         user_key = self.anonymous_id if self.is_anonymous else str(self.user.pk)
         await ASYNC_REDIS.sadd(active_set_key(self.project_id), user_key)
         await ASYNC_REDIS.expire(active_set_key(self.project_id), 60)
-        await ASYNC_REDIS.sadd(ACTIVE_PROJECTS_SET, str(self.project_id))
+        await ASYNC_REDIS.sadd(active_projects_shard(self.project_id), str(self.project_id))
 
         # Notify others
-        await self.channel_layer.group_send(self.room, {"type": "users_changed"})
+        await self._group_send({"type": "users_changed"})
 
         # Send Initial YJS Sync
-        ydoc_bytes = await ASYNC_REDIS.get(ydoc_key(self.project_id))
-        if ydoc_bytes:
-            await self.send_json({
-                "type": "sync",
-                "ydoc_b64": base64.b64encode(ydoc_bytes).decode()
-            })
-        else:
-            code_obj = await database_sync_to_async(lambda: getattr(Project.objects.get(id=self.project_id), "code", None))()
-            text = code_obj.content if code_obj else ""
-            await self.send_json({"type": "initial", "content": text})
+        await self._send_sync()
 
         await self._send_voice_room_update()
         self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
 
-    def _validate_share_token(self, token, current_gid, current_pid):
-        """Helper to validate signed share links"""
+    async def _send_text(self, text):
+        await self.send(text_data=text)
+
+    async def _send_sync(self):
+        self.outbox.put_update(await self._sync_frame())
+
+    async def _sync_frame(self):
+        """The whole ydoc if the room has one, otherwise the saved code so the client can start a new doc"""
+        if self.local_room:
+            ydoc_bytes = self.local_room.state()
+        else:
+            ydoc_bytes = await ASYNC_REDIS.get(ydoc_key(self.project_id))
+            if not ydoc_bytes:
+                # Projects cloned from a live project get a copy of its ydoc the first time they're opened
+                ydoc_bytes = await claim_cloned_ydoc(self.project_id)
+
+        # Viewers can't start the doc from the saved code themselves, they get a sync once there is one (see viewer_updates)
+        self.awaiting_doc = not ydoc_bytes
+        if ydoc_bytes:
+            metrics.SYNC_BYTES.labels("sync").observe(len(ydoc_bytes))
+            return json.dumps({
+                "type": "sync",
+                "ydoc_b64": base64.b64encode(ydoc_bytes).decode()
+            })
+        text = await self._saved_code(self.project_id) or ""
+        metrics.SYNC_BYTES.labels("initial").observe(len(text))
+        return json.dumps({"type": "initial", "content": text})
+
+    async def _connect_viewer(self):
+        """Read-only connection: the doc and its updates (batched), no awareness, chat, roster, voice or heartbeat"""
+        # The link is only as good as the project, it could have been deleted (or moved) since it was signed
+        if not await self._project_exists(self.group_id, self.project_id):
+            logger.info("connection rejected", extra={"event": "ws.reject", "reason": "no_project"})
+            await self.close(code=4003)
+            return
+        await self.channel_layer.group_add(viewers.group_name(self.room), self.channel_name)
+        await self.accept()
+        self.accepted = True
+        self.outbox.start()
+        control.register(self)
+        metrics.connection_opened(self.project_id)
+        await self._send_sync()
+
+    def _share_token_type(self, token, current_gid, current_pid):
+        """Helper to validate signed share links, returns "share_link" (edit), "view_link" (read-only) or None"""
         if not token:
-            return False
+            return None
         
         signer = signing.TimestampSigner()
         try:
@@ -111,15 +209,38 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
             
             if str(data.get('pid')) == str(current_pid) and \
                str(data.get('gid')) == str(current_gid) and \
-               data.get('type') == 'share_link':
-                return True
+               data.get('type') in ('share_link', 'view_link'):
+                return data['type']
                 
         except (signing.BadSignature, signing.SignatureExpired):
-            return False
+            return None
             
-        return False
+        return None
 
     async def disconnect(self, close_code):
+        if getattr(self, "accepted", False):
+            metrics.connection_closed(self.project_id)
+            logger.info("disconnected", extra={"event": "ws.disconnect", "close_code": close_code})
+        if getattr(self, "outbox", None):
+            self.outbox.stop()
+            self.limiter.close()
+            if self.held_back_task:
+                self.held_back_task.cancel()
+
+        if getattr(self, "viewer", False):
+            control.unregister(self)
+            await self.channel_layer.group_discard(viewers.group_name(self.room), self.channel_name)
+            return
+
+        if getattr(self, "local_room", None):
+            await rooms.release_room(self.local_room, self)
+        if getattr(self, "redirected", False):
+            # They're reconnecting to the owner, its connection takes over their spot in the room
+            if hasattr(self, "heartbeat_task"):
+                self.heartbeat_task.cancel()
+            await self._leave_groups()
+            return
+
         try:
             # Get the user key (anonymous_id or user.pk)
             user_key = self.anonymous_id if self.is_anonymous else (str(self.user.pk) if self.user and self.user.is_authenticated else None)
@@ -129,32 +250,39 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
                 await ASYNC_REDIS.srem(voice_room_key(self.project_id), user_key)
                 await ASYNC_REDIS.delete(user_color_key(user_key))
                 
-                await self.channel_layer.group_send(self.room, {"type": "users_changed"})
-                await self.channel_layer.group_send(self.room, {"type": "voice_room_update"})
+                await self._group_send({"type": "users_changed"})
+                await self._group_send({"type": "voice_room_update"})
                 
-                await self.channel_layer.group_send(
-                    self.room,
-                    {
-                        "type": "broadcast.remove_awareness",
-                        "user_id": user_key,
-                        "sender": self.channel_name
-                    }
+                await self._group_broadcast(
+                    "broadcast.remove_awareness",
+                    {"type": "remove_awareness", "user_id": user_key},
+                    sender=self.channel_name,
                 )
 
                 remaining = await ASYNC_REDIS.scard(active_set_key(self.project_id))
                 if remaining == 0:
-                    await ASYNC_REDIS.srem(ACTIVE_PROJECTS_SET, str(self.project_id))
+                    await ASYNC_REDIS.srem(active_projects_shard(self.project_id), str(self.project_id))
                     if not self.forced_disconnect:
-                        await database_sync_to_async(persist_ydoc_to_db)(self.project_id)
+                        await DB_EXECUTOR.run(persist_ydoc_to_db, self.project_id)
 
-        except Exception as e:
-            print(f"Error during disconnect cleanup: {e}")
+        except Exception:
+            logger.exception("error during disconnect cleanup", extra={"event": "ws.disconnect_error"})
 
         if hasattr(self, "heartbeat_task"):
             self.heartbeat_task.cancel()
 
+        await self._leave_groups()
+
+    async def _leave_groups(self):
+        control.unregister(self)
         await self.channel_layer.group_discard(self.room, self.channel_name)
-        await self.channel_layer.group_discard("global_connection_group", self.channel_name)
+
+    async def redirect(self, owner, url):
+        """Sends the client to the node that owns the room at url (close code 4010, see rooms.py)"""
+        self.redirected = True
+        logger.info("redirecting to room owner", extra={"event": "room.redirect", "owner": owner})
+        await self.send_json({"type": "redirect", "node": owner, "url": url})
+        await self.close(code=4010)
 
     async def force_disconnect(self, event):
         self.forced_disconnect = True
@@ -163,12 +291,13 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
     async def broadcast_remove_awareness(self, event):
         if event.get("sender") == self.channel_name:
             return
-        await self.send_json({"type": "remove_awareness", "user_id": event["user_id"]})
+        self.outbox.put_message(event["frame"])
 
     async def users_changed(self, event):
         try:
             active_user_ids = await ASYNC_REDIS.smembers(active_set_key(self.project_id))
             active_users = []
+            users = await self._users_by_id(active_user_ids)
 
             for uid_bytes in active_user_ids:
                 uid_str = uid_bytes.decode() if isinstance(uid_bytes, bytes) else str(uid_bytes)
@@ -194,8 +323,8 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
                     # Authenticated user
                     try:
                         uid = int(uid_str)
-                        user_obj = await database_sync_to_async(User.objects.get)(pk=uid)
-                        
+                        user_obj = users[uid]
+
                         color_data = await ASYNC_REDIS.get(user_color_key(uid))
                         if color_data:
                             color = json.loads(color_data)
@@ -209,59 +338,112 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
                             "color": color["color"],
                             "colorLight": color["light"]
                         })
-                    except (User.DoesNotExist, ValueError):
+                    except (KeyError, ValueError):
                         continue
 
-            await self.send_json({"type": "connection", "users": active_users})
-        except Exception as e:
-            print(f"Error in users_changed: {e}")
+            # Only the latest roster matters if the socket is behind
+            self.outbox.put_message(json.dumps({"type": "connection", "users": active_users}), key="connection")
+        except Exception:
+            logger.exception("error in users_changed", extra={"event": "ws.users_changed_error"})
 
     async def receive(self, text_data=None, bytes_data=None):
         if not text_data:
             return
 
-        if len(text_data.encode()) > settings.MAX_MESSAGE_SIZE:
-            await self.send_json({"type": "error", "message": "Message too large"})
+        # A char is 1 to 4 bytes in utf-8, so we only have to encode it when the length alone can't tell
+        size = len(text_data)
+        if size > settings.MAX_MESSAGE_SIZE or (size * 4 > settings.MAX_MESSAGE_SIZE and len(text_data.encode()) > settings.MAX_MESSAGE_SIZE):
+            self.outbox.put_message(json.dumps({"type": "error", "message": "Message too large"}))
             return
-        
-        try:
-            msg = json.loads(text_data)
-            mtype = msg.get("type")
-        except Exception:
+
+        # Everything up to the rate limit happens before we decode anything
+        msg = None
+        mtype = ratelimit.peek_type(text_data)
+        if mtype is None:
+            # The type isn't the first key (or isn't a plain name), it's small enough to just decode it
+            msg = _decode(text_data)
+            mtype = msg.get("type") if msg is not None else None
+            if not isinstance(mtype, str):
+                metrics.WS_MESSAGES.labels("unparsed").inc()
+                return
+
+        # Viewers can only ask for the doc again and ping, anything else they send gets dropped
+        if self.viewer and mtype not in ("request_sync", "ping"):
+            return
+
+        label = metrics.message_label(mtype)
+        wait, scope = self.limiter.acquire(mtype)
+        if wait:
+            if mtype not in settings.WS_RATE_LIMIT_DELAYED:
+                metrics.WS_RATE_LIMITED.labels(label, scope, "dropped").inc()
+                return
+            if scope == "connection" and wait > settings.WS_RATE_LIMIT_MAX_DELAY:
+                metrics.WS_RATE_LIMITED.labels(label, scope, "closed").inc()
+                logger.warning("closing flooding connection", extra={"event": "ws.rate_limit_close", "mtype": label, "scope": scope})
+                await self.close(code=4029)
+                return
+            metrics.WS_RATE_LIMITED.labels(label, scope, "delayed").inc()
+
+        if mtype in settings.WS_RATE_LIMIT_DELAYED and (wait or self.held_back):
+            # Held back on its own task rather than sleeping here, channels handles a consumer's events one at a
+            # time and the room's updates to this socket would wait too. Once one is waiting the ones after it
+            # queue up behind it, so they still get applied in order
+            self._hold_back(time.monotonic() + wait, mtype, label, text_data, msg)
             return
+        await self._handle_message(mtype, label, text_data, msg)
+
+    def _hold_back(self, due, mtype, label, text_data, msg):
+        self.held_back.append((due, mtype, label, text_data, msg))
+        if self.held_back_task is None:
+            self.held_back_task = asyncio.create_task(self._release_held_back())
+
+    async def _release_held_back(self):
+        try:
+            while self.held_back:
+                due, mtype, label, text_data, msg = self.held_back[0]
+                await asyncio.sleep(due - time.monotonic())
+                self.held_back.popleft()
+                await self._handle_message(mtype, label, text_data, msg)
+        finally:
+            self.held_back_task = None
+
+    async def _handle_message(self, mtype, label, text_data, msg=None):
+        if msg is None:
+            msg = _decode(text_data)
+            # The type we limited is the one we handle ({"type": "ping", "type": "update"} decodes as an update)
+            if msg is None or msg.get("type") != mtype:
+                return
 
+        metrics.WS_MESSAGES.labels(label).inc()
+        start = time.perf_counter()
         try:
             if mtype == "update":
                 update_b64 = msg.get("update_b64")
                 if not update_b64: return
                 update_bytes = base64.b64decode(update_b64)
-                await self._apply_update_to_redis_ydoc(self.project_id, update_bytes)
-                await self.channel_layer.group_send(self.room, {
-                    "type": "broadcast.update",
-                    "update_b64": update_b64,
-                    "sender": self.channel_name
-                })
+                metrics.UPDATE_BYTES.observe(len(update_bytes))
+                if self.local_room:
+                    await self.local_room.apply(update_bytes)
+                else:
+                    await self._apply_update_to_redis_ydoc(self.project_id, update_bytes)
+                fields = {"sender": self.channel_name, "owned": self.local_room is not None}
+                if not fields["owned"]:
+                    # The owner's room applies updates it didn't see itself, see broadcast_update
+                    fields["update_b64"] = update_b64
+                await self._group_broadcast("broadcast.update", {"type": "update", "update_b64": update_b64}, **fields)
+                viewers.queue_update(self.channel_layer, self.room, update_b64)
 
             elif mtype == "request_sync":
-                ydoc_bytes = await ASYNC_REDIS.get(ydoc_key(self.project_id))
-                if ydoc_bytes:
-                    await self.send_json({
-                        "type": "sync",
-                        "ydoc_b64": base64.b64encode(ydoc_bytes).decode()
-                    })
-                else:
-                    code_obj = await database_sync_to_async(lambda: getattr(Project.objects.get(id=self.project_id), "code", None))()
-                    text = code_obj.content if code_obj else ""
-                    await self.send_json({"type": "initial", "content": text})
+                await self._send_sync()
 
             elif mtype == "awareness":
                 update_b64 = msg.get("update_b64")
                 if not update_b64: return
-                await self.channel_layer.group_send(self.room, {
-                    "type": "broadcast.awareness",
-                    "update_b64": update_b64,
-                    "sender": self.channel_name
-                })
+                await self._group_broadcast(
+                    "broadcast.awareness",
+                    {"type": "awareness", "update_b64": update_b64},
+                    sender=self.channel_name,
+                )
 
             elif mtype == "chat_message":
                 message = msg.get("message", "").strip()
@@ -274,14 +456,14 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
                     hero_name = self.anonymous_id[5:]
                     user_email = f"🦸 {hero_name}"
                 else:
-                    user_obj = await database_sync_to_async(User.objects.get)(pk=self.user.pk)
-                    user_email = user_obj.email
+                    # The middleware already loaded the user
+                    user_email = self.user.email
                 
-                color_data = await ASYNC_REDIS.get(f"user_color:{user_key}")
+                color_data = await ASYNC_REDIS.get(user_color_key(user_key))
                 color = json.loads(color_data) if color_data else {"color": "#30bced", "light": "#30bced33"}
                 
-                await self.channel_layer.group_send(self.room, {
-                    "type": "broadcast.chat_message",
+                await self._group_broadcast("broadcast.chat_message", {
+                    "type": "chat_message",
                     "message": message,
                     "user_id": user_key,
                     "user_email": user_email,
@@ -292,19 +474,19 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
             elif mtype == "join_voice":
                 user_key = self.anonymous_id if self.is_anonymous else str(self.user.pk)
                 await ASYNC_REDIS.sadd(voice_room_key(self.project_id), user_key)
-                await self.channel_layer.group_send(self.room, {"type": "voice_room_update"})
+                await self._group_send({"type": "voice_room_update"})
 
             elif mtype == "leave_voice":
                 user_key = self.anonymous_id if self.is_anonymous else str(self.user.pk)
                 await ASYNC_REDIS.srem(voice_room_key(self.project_id), user_key)
-                await self.channel_layer.group_send(self.room, {"type": "voice_room_update"})
+                await self._group_send({"type": "voice_room_update"})
 
             elif mtype == "voice_signal":
                 target_user = msg.get("target_user")
                 signal_data = msg.get("signal_data")
                 user_key = self.anonymous_id if self.is_anonymous else str(self.user.pk)
                 if target_user and signal_data:
-                    await self.channel_layer.group_send(self.room, {
+                    await self._group_send({
                         "type": "broadcast.voice_signal",
                         "from_user": user_key,
                         "target_user": target_user,
@@ -313,28 +495,51 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
                     })
 
             elif mtype == "ping":
-                await self.send(json.dumps({'type': 'pong', 'timestamp': msg.get('timestamp')}))
+                self.outbox.put_message(json.dumps({'type': 'pong', 'timestamp': msg.get('timestamp')}))
             
-        except Exception as e:
-            print(f"Error processing message: {e}")
+        except Exception:
+            logger.exception("error processing message", extra={"event": "ws.receive_error", "mtype": label})
+        finally:
+            duration = time.perf_counter() - start
+            metrics.WS_HANDLER_SECONDS.labels(label).observe(duration)
+            log_span(logger, "ws.receive", duration, logging.DEBUG, mtype=label)
+
+    async def _group_send(self, event):
+        """group_send to this room, timed for /metrics"""
+        start = time.perf_counter()
+        try:
+            await self.channel_layer.group_send(self.room, event)
+        finally:
+            metrics.GROUP_SEND_SECONDS.labels(event["type"]).observe(time.perf_counter() - start)
+
+    async def _group_broadcast(self, event_type, payload, **fields):
+        """
+        Sends payload to everyone in the room as a ready-made frame. It gets encoded once here instead of
+        once per recipient, the handlers just pass event["frame"] along
+        """
+        await self._group_send({"type": event_type, "frame": json.dumps(payload), **fields})
 
     async def broadcast_update(self, event):
         if event.get("sender") == self.channel_name: return
-        await self.send_json({"type": "update", "update_b64": event["update_b64"]})
+        if self.local_room and not event.get("owned", True):
+            # Applied to redis by a connection that isn't on this node, keep our copy in step
+            await self.local_room.apply_remote(event["update_b64"], base64.b64decode(event["update_b64"]))
+        self.outbox.put_update(event["frame"])
     
     async def broadcast_awareness(self, event):
         if event.get("sender") == self.channel_name: return
-        await self.send_json({"type": "awareness", "update_b64": event["update_b64"]})
+        # A newer state from the same sender replaces the one still waiting
+        self.outbox.put_awareness(event["sender"], event["frame"])
 
     async def broadcast_chat_message(self, event):
-        await self.send_json({
-            "type": "chat_message",
-            "message": event["message"],
-            "user_id": event["user_id"],
-            "user_email": event["user_email"],
-            "color": event["color"],
-            "timestamp": event["timestamp"]
-        })
+        self.outbox.put_message(event["frame"])
+
+    async def viewer_updates(self, event):
+        if self.awaiting_doc:
+            # We only had the saved code to show them, the updates need the doc they were made on. It includes them
+            await self._send_sync()
+            return
+        self.outbox.put_update(event["frame"])
 
     async def voice_room_update(self, event):
         await self._send_voice_room_update()
@@ -343,16 +548,17 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
         if event.get("sender") == self.channel_name: return
         user_key = self.anonymous_id if self.is_anonymous else str(self.user.pk)
         if event["target_user"] == user_key:
-            await self.send_json({
+            self.outbox.put_message(json.dumps({
                 "type": "voice_signal",
                 "from_user": event["from_user"],
                 "signal_data": event["signal_data"]
-            })
+            }))
 
     async def _send_voice_room_update(self):
         try:
             voice_user_ids = await ASYNC_REDIS.smembers(voice_room_key(self.project_id))
             voice_users = []
+            users = await self._users_by_id(voice_user_ids)
             for uid_bytes in voice_user_ids:
                 uid_str = uid_bytes.decode() if isinstance(uid_bytes, bytes) else str(uid_bytes)
                 
@@ -361,24 +567,37 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
                     voice_users.append({"id": uid_str, "email": f"🦸 {hero_name}"})
                 else:
                     try:
-                        uid = int(uid_str)
-                        user_obj = await database_sync_to_async(User.objects.get)(pk=uid)
+                        user_obj = users[int(uid_str)]
                         voice_users.append({"id": str(user_obj.pk), "email": user_obj.email})
-                    except (User.DoesNotExist, ValueError):
+                    except (KeyError, ValueError):
                         continue
-            await self.send_json({"type": "voice_room_update", "participants": voice_users})
-        except Exception as e:
-            print(f"Error sending voice room update: {e}")
+            self.outbox.put_message(json.dumps({"type": "voice_room_update", "participants": voice_users}), key="voice_room_update")
+        except Exception:
+            logger.exception("error sending voice room update", extra={"event": "ws.voice_update_error"})
 
-    @database_sync_to_async
-    def _validate_membership(self, user, group_id, project_id):
-        try:
-            project = Project.objects.select_related("group").get(id=project_id)
-        except Project.DoesNotExist:
-            return False
-        if project.group.id != group_id:
-            return False
-        return user in project.group.group_members.all()
+    async def _validate_membership(self, user, group_id, project_id):
+        # One EXISTS query instead of loading the project, the group and all its members. On the primary, like every permission check
+        return await DB_EXECUTOR.run(Project.objects.filter(id=project_id, group_id=group_id, group__group_members=user).exists)
+
+    async def _project_exists(self, group_id, project_id):
+        return await DB_EXECUTOR.run(Project.objects.filter(id=project_id, group_id=group_id).exists)
+
+    async def _saved_code(self, project_id):
+        return await DB_EXECUTOR.run(Code.objects.filter(project_id=project_id).values_list("content", flat=True).first)
+
+    async def _users_by_id(self, uid_members):
+        """Loads the authenticated users out of a Redis set of user keys in one query"""
+        ids = []
+        for uid_bytes in uid_members:
+            uid_str = uid_bytes.decode() if isinstance(uid_bytes, bytes) else str(uid_bytes)
+            if uid_str.isdigit():
+                ids.append(int(uid_str))
+        if not ids:
+            return {}
+
+        def load_users():
+            return {user.pk: user for user in User.objects.filter(pk__in=ids).only("id", "email")}
+        return await DB_EXECUTOR.run(load_users)
 
     async def _apply_update_to_redis_ydoc(self, project_id, update_bytes: bytes):
         key = ydoc_key(project_id)
@@ -387,7 +606,14 @@ class YjsCodeConsumer(AsyncJsonWebsocketConsumer):
         if cur: apply_update(ydoc, cur)
         apply_update(ydoc, update_bytes)
         new_bytes = Y.encode_state_as_update(ydoc)
-        await ASYNC_REDIS.set(key, new_bytes)
+        metrics.DOC_BYTES.observe(len(new_bytes))
+
+        # We already have the doc decoded, so keep its plaintext next to it for readers (persist, snippets, exports)
+        text = str(ydoc.get_text("codetext"))
+        pipe = ASYNC_REDIS.pipeline(transaction=True)
+        pipe.set(key, new_bytes)
+        set_text_view(pipe, project_id, text)
+        await pipe.execute()
 
     async def _heartbeat_loop(self):
         try:
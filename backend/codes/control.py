@@ -0,0 +1,77 @@
+import asyncio
+import contextvars
+import json
+import logging
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Admin commands for every open socket (force_disconnect from disconnect_users). Instead of putting every socket in one
+# channel layer group, which RedisChannelLayer keeps as a sorted set that gets rewritten on every connect, each server
+# process subscribes to one redis pub/sub channel and hands the command to its own sockets
+
+CONTROL_CHANNEL = "ws_control"
+COMMANDS = {"force_disconnect"}     # consumer handlers a command can call
+
+_local_consumers = set()
+_listener = None
+
+def register(consumer):
+    _local_consumers.add(consumer)
+    _ensure_listener()
+
+def unregister(consumer):
+    _local_consumers.discard(consumer)
+
+def stop():
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        _listener = None
+
+def publish(command, **fields):
+    """Sends a command to every server process, returns how many got it"""
+    client = redis.from_url(settings.REDIS_CHANNELS_URL)
+    try:
+        return client.publish(CONTROL_CHANNEL, json.dumps({"type": command, **fields}))
+    finally:
+        client.close()
+
+def _ensure_listener():
+    global _listener
+    # One per process, started by the first socket (a new event loop, like in tests, gets a new one).
+    # Its own context, otherwise it logs with the log context of whichever socket started it
+    if _listener is None or _listener.done() or _listener.get_loop() is not asyncio.get_running_loop():
+        _listener = asyncio.create_task(_listen(), context=contextvars.Context())
+
+async def _listen():
+    while True:
+        client = aioredis.from_url(settings.REDIS_CHANNELS_URL)
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(CONTROL_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        await _relay(json.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("control channel listener failed, resubscribing", extra={"event": "control.listener_error"})
+            await asyncio.sleep(1)
+        finally:
+            await client.aclose()
+
+async def _relay(event):
+    command = event.get("type")
+    if command not in COMMANDS:
+        logger.warning("unknown control command", extra={"event": "control.unknown", "command": command})
+        return
+    logger.info("relaying control command", extra={"event": "control.relay", "command": command, "sockets": len(_local_consumers)})
+    # Copy, the handlers close sockets and those unregister themselves
+    for consumer in list(_local_consumers):
+        try:
+            await getattr(consumer, command)(event)
+        except Exception:
+            logger.exception("control command failed on a socket", extra={"event": "control.relay_error", "command": command})
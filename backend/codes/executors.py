@@ -0,0 +1,83 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Every DB call the consumers make: membership checks, the saved code, roster users and persisting ydocs (locks,
+# select_for_update). They get their own pool instead of waiting on channels' one thread for sync code, so a burst of
+# connects or disconnects can't hold up everything else, and we can see how far behind it is
+
+class DBExecutor:
+    """Thread pool for sync DB work, keeping track of its queue depth and how long calls wait for a thread"""
+
+    def __init__(self, max_workers, name="consumer-db"):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0             # submitted, waiting for a thread
+        self.running = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, func, *args, **kwargs):
+        submitted = time.monotonic()
+        with self._lock:
+            self.queued += 1
+        metrics.DB_EXECUTOR_QUEUED.inc()
+
+        def call():
+            waited = time.monotonic() - submitted
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            metrics.DB_EXECUTOR_QUEUED.dec()
+            metrics.DB_EXECUTOR_RUNNING.inc()
+            metrics.DB_EXECUTOR_MAX_WAIT.set(self.max_wait)
+            if waited > settings.DB_EXECUTOR_WAIT_WARNING:
+                logger.warning("db executor call waited for a thread", extra={
+                    "event": "db_executor_wait", "func": func.__name__, "wait_s": round(waited, 3), "queued": self.queued,
+                })
+
+            # Same connection handling as database_sync_to_async
+            close_old_connections()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                close_old_connections()
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                metrics.DB_EXECUTOR_RUNNING.dec()
+                metrics.DB_EXECUTOR_CALLS.inc()
+
+        # run_in_executor doesn't carry the context over, copy it so log lines keep the connection's ids
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, call)
+
+    def shutdown(self):
+        """Waits for the calls already submitted (persists of rooms that just closed) to finish"""
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "avg_wait": self.total_wait / self.completed if self.completed else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+DB_EXECUTOR = DBExecutor(settings.DB_EXECUTOR_WORKERS)
@@ -0,0 +1,32 @@
+import asyncio
+import logging
+from django.conf import settings
+
+from . import control, metrics, rooms
+from .executors import DB_EXECUTOR
+
+logger = logging.getLogger(__name__)
+
+# ASGI lifespan events, for servers that send them (uvicorn does, daphne doesn't). By the time shutdown comes the
+# server has already closed this worker's sockets and their disconnects ran, so this is only what's left over:
+# rooms that are still ours, persists still in the DB executor, and this worker's metrics files
+
+class Lifespan:
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                logger.info("worker started", extra={"event": "worker.startup", "node_id": settings.NODE_ID})
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def shutdown(self):
+        control.stop()
+        await rooms.release_all()
+        # Blocks until they're done, in a thread so the loop can still finish anything they wait on
+        await asyncio.to_thread(DB_EXECUTOR.shutdown)
+        metrics.process_exiting()
+        logger.info("worker stopped", extra={"event": "worker.shutdown", "node_id": settings.NODE_ID})
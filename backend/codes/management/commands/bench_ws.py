@@ -0,0 +1,356 @@
+import asyncio
+import base64
+import json
+import os
+import random
+import statistics
+import string
+import time
+from datetime import datetime, timezone
+import redis
+import y_py as Y
+from django.conf import settings
+from django.core import signing
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import User
+from usergroups.models import Group
+from projects.models import Project
+from codes.models import Code
+from codes.redis_helpers import SYNC_REDIS, clear_project_keys
+
+# websockets is only needed to benchmark a running server (--url), in-process runs go through channels' test client
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+WS_PATH = "ws/groups/{group_id}/projects/{project_id}/code/"
+
+class _CommunicatorClient:
+    """In-process connection through channels' WebsocketCommunicator"""
+
+    def __init__(self, path):
+        from channels.testing import WebsocketCommunicator
+        from backend.asgi import application
+        self._communicator = WebsocketCommunicator(application, path)
+
+    async def connect(self):
+        connected, code = await self._communicator.connect(timeout=10)
+        if not connected:
+            raise ConnectionError(f"rejected with {code}")
+
+    async def send(self, text):
+        await self._communicator.send_to(text_data=text)
+
+    async def recv(self):
+        return await self._communicator.receive_from(timeout=60)
+
+    async def close(self):
+        await self._communicator.disconnect()
+
+class _WebsocketClient:
+    """Connection to a running server (the docker-compose stack)"""
+
+    def __init__(self, url):
+        self._url = url
+        self._ws = None
+
+    async def connect(self):
+        self._ws = await websockets.connect(self._url, max_size=None)
+
+    async def send(self, text):
+        await self._ws.send(text)
+
+    async def recv(self):
+        return await self._ws.recv()
+
+    async def close(self):
+        await self._ws.close()
+
+class _Editor:
+    """A simulated editor: its own YDoc, types into it and sends the updates like the frontend does"""
+
+    def __init__(self, client, sent_at, latencies):
+        self.client = client
+        self.ydoc = Y.YDoc()
+        self.text = self.ydoc.get_text("codetext")
+        self.sent_at = sent_at          # update_b64 -> when it was sent, shared by everyone in the room
+        self.latencies = latencies
+        self.updates_sent = 0
+        self.updates_received = 0
+        self.errors = 0
+
+    async def type_once(self):
+        before = Y.encode_state_vector(self.ydoc)
+        with self.ydoc.begin_transaction() as txn:
+            self.text.insert(txn, random.randint(0, len(str(self.text))), random.choice(string.ascii_letters))
+        update_b64 = base64.b64encode(Y.encode_state_as_update(self.ydoc, before)).decode()
+        self.sent_at[update_b64] = time.perf_counter()
+        await self.client.send(json.dumps({"type": "update", "update_b64": update_b64}))
+        self.updates_sent += 1
+
+    async def send_awareness(self, size):
+        payload = base64.b64encode(os.urandom(size)).decode()
+        await self.client.send(json.dumps({"type": "awareness", "update_b64": payload}))
+
+    async def send_chat(self):
+        await self.client.send(json.dumps({"type": "chat_message", "message": "bench " + "".join(random.choices(string.ascii_lowercase, k=20))}))
+
+    async def read_loop(self):
+        while True:
+            msg = json.loads(await self.client.recv())
+            mtype = msg.get("type")
+            if mtype == "update":
+                sent = self.sent_at.get(msg["update_b64"])
+                if sent is not None:
+                    self.latencies.append((time.perf_counter() - sent) * 1000)
+                Y.apply_update(self.ydoc, base64.b64decode(msg["update_b64"]))
+                self.updates_received += 1
+            elif mtype == "sync":
+                Y.apply_update(self.ydoc, base64.b64decode(msg["ydoc_b64"]))
+            elif mtype == "error":
+                self.errors += 1
+
+class _Viewer:
+    """A read-only viewer (view_link), only receives the batched updates"""
+
+    def __init__(self, client, sent_at, latencies):
+        self.client = client
+        self.ydoc = Y.YDoc()
+        self.sent_at = sent_at
+        self.latencies = latencies
+        self.frames_received = 0
+        self.updates_received = 0
+
+    async def read_loop(self):
+        while True:
+            msg = json.loads(await self.client.recv())
+            mtype = msg.get("type")
+            if mtype == "updates":
+                self.frames_received += 1
+                now = time.perf_counter()
+                for update_b64 in msg["updates_b64"]:
+                    sent = self.sent_at.get(update_b64)
+                    if sent is not None:
+                        self.latencies.append((now - sent) * 1000)
+                    Y.apply_update(self.ydoc, base64.b64decode(update_b64))
+                self.updates_received += len(msg["updates_b64"])
+            elif mtype == "sync":
+                Y.apply_update(self.ydoc, base64.b64decode(msg["ydoc_b64"]))
+
+def _quantiles(latencies):
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "samples": len(latencies),
+        "p50": round(quantiles[49], 2),
+        "p95": round(quantiles[94], 2),
+        "p99": round(quantiles[98], 2),
+    }
+
+class Command(BaseCommand):
+    help = "Load test the code websocket: R rooms x E y_py editors typing, with awareness and chat traffic, and optionally V read-only viewers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=10)
+        parser.add_argument("--editors", type=int, default=5, help="Editors per room")
+        parser.add_argument("--viewers", type=int, default=0, help="Read-only viewers per room (view links)")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds of traffic after everyone connected")
+        parser.add_argument("--update-rate", type=float, default=2, help="Updates per second per editor")
+        parser.add_argument("--awareness-rate", type=float, default=4, help="Awareness messages per second per editor")
+        parser.add_argument("--awareness-size", type=int, default=120, help="Bytes per awareness update")
+        parser.add_argument("--chat-rate", type=float, default=0.05, help="Chat messages per second per editor")
+        parser.add_argument("--url", help="Base url of a running server (e.g. ws://localhost:8000), otherwise runs in-process")
+        parser.add_argument("--server-pid", type=int, help="Pid of the server process, to measure its CPU when using --url")
+        parser.add_argument(
+            "--layer", choices=sorted(settings.CHANNEL_LAYER_BACKENDS),
+            help="Channel layer for in-process runs (default CHANNEL_LAYER_BACKEND), a running server uses its own setting",
+        )
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--compare", help="Compare against the results of an earlier run")
+
+    def handle(self, *args, **options):
+        if options["url"] and websockets is None:
+            raise CommandError("--url needs the websockets package (pip install websockets)")
+        if options["url"] and options["layer"]:
+            raise CommandError("--layer only works in-process, set CHANNEL_LAYER_BACKEND on the server instead")
+
+        channel_layers = settings.CHANNEL_LAYERS
+        if options["layer"]:
+            default = channel_layers["default"]
+            channel_layers = {"default": {**default, "BACKEND": settings.CHANNEL_LAYER_BACKENDS[options["layer"]]}}
+
+        group, users, projects = self._seed(options["rooms"], options["editors"])
+        try:
+            with override_settings(CHANNEL_LAYERS=channel_layers):
+                results = asyncio.run(self._run(group, users, projects, options))
+        finally:
+            clear_project_keys([p.id for p in projects])
+            # The group delete cascades to the projects and codes
+            Group.all_objects.filter(id=group.id).delete()
+            User.objects.filter(id__in=[u.id for u in users]).delete()
+
+        self._report(results)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved results to {options['output']}"))
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                self._compare(json.load(f), results)
+
+    def _seed(self, num_rooms, num_editors):
+        # Every editor in a room has to be a different user, the active set is keyed by user id
+        prefix = f"bench_ws_{time.time_ns()}"
+        users = [User.objects.create_user(email=f"{prefix}_{i}@example.com") for i in range(num_editors)]
+        group = Group.objects.create(owner=users[0], group_name="bench_ws")
+        group.group_members.add(*users)
+        projects = Project.objects.bulk_create([Project(project_name=f"bench room {i}", group=group) for i in range(num_rooms)])
+        Code.objects.bulk_create([Code(project=p, content="") for p in projects])
+        return group, users, projects
+
+    def _client(self, options, group, project, user=None):
+        if user is None:
+            # Anonymous, with a view link
+            token = signing.TimestampSigner().sign_object({"pid": project.id, "gid": group.id, "type": "view_link"})
+            path = WS_PATH.format(group_id=group.id, project_id=project.id) + f"?share_token={token}"
+        else:
+            token = RefreshToken.for_user(user).access_token
+            path = WS_PATH.format(group_id=group.id, project_id=project.id) + f"?token={token}"
+        if options["url"]:
+            return _WebsocketClient(f"{options['url'].rstrip('/')}/{path}")
+        return _CommunicatorClient(f"/{path}")
+
+    async def _run(self, group, users, projects, options):
+        latencies = []
+        viewer_latencies = []
+        editors = []
+        viewers = []
+        for project in projects:
+            sent_at = {}
+            for user in users:
+                editors.append(_Editor(self._client(options, group, project, user), sent_at, latencies))
+            for _ in range(options["viewers"]):
+                viewers.append(_Viewer(self._client(options, group, project), sent_at, viewer_latencies))
+
+        await asyncio.gather(*(conn.client.connect() for conn in editors + viewers))
+        readers = [asyncio.create_task(conn.read_loop()) for conn in editors + viewers]
+
+        # The fan-out traffic goes to the channels redis, which can be a different server than the docs one
+        channels_redis = redis.from_url(settings.REDIS_CHANNELS_URL)
+        redis_before = SYNC_REDIS.info()
+        redis_cpu_before = self._redis_cpu_seconds(channels_redis)
+        cpu_before = self._cpu_seconds(options)
+        start = time.perf_counter()
+
+        async def traffic(editor):
+            deadline = start + options["duration"]
+            now = time.perf_counter()
+            # A rate of 0 turns that kind of traffic off
+            next_update = now if options["update_rate"] else float("inf")
+            next_awareness = now if options["awareness_rate"] else float("inf")
+            next_chat = now if options["chat_rate"] else float("inf")
+            while time.perf_counter() < deadline:
+                now = time.perf_counter()
+                if now >= next_update:
+                    await editor.type_once()
+                    next_update = now + random.expovariate(options["update_rate"])
+                if now >= next_awareness:
+                    await editor.send_awareness(options["awareness_size"])
+                    next_awareness = now + random.expovariate(options["awareness_rate"])
+                if now >= next_chat:
+                    await editor.send_chat()
+                    next_chat = now + random.expovariate(options["chat_rate"])
+                wake = min(next_update, next_awareness, next_chat, deadline)
+                await asyncio.sleep(max(0, wake - time.perf_counter()))
+
+        await asyncio.gather(*(traffic(editor) for editor in editors))
+        # Give the last updates time to arrive
+        await asyncio.sleep(1)
+        elapsed = time.perf_counter() - start
+        cpu_after = self._cpu_seconds(options)
+        redis_after = SYNC_REDIS.info()
+        redis_cpu_after = self._redis_cpu_seconds(channels_redis)
+        channels_redis.close()
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*(conn.client.close() for conn in editors + viewers), return_exceptions=True)
+
+        connections = len(editors) + len(viewers)
+        ops = redis_after["total_commands_processed"] - redis_before["total_commands_processed"]
+        return {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "mode": "url" if options["url"] else "in-process",
+            "channel_layer": settings.CHANNEL_LAYERS["default"]["BACKEND"],
+            "rooms": len(projects),
+            "editors_per_room": len(users),
+            "viewers_per_room": options["viewers"],
+            "connections": connections,
+            "duration_s": round(elapsed, 2),
+            "updates_sent": sum(e.updates_sent for e in editors),
+            "updates_received": sum(e.updates_received for e in editors),
+            "errors": sum(e.errors for e in editors),
+            "latency_ms": _quantiles(latencies),
+            "viewer_frames_received": sum(v.frames_received for v in viewers),
+            "viewer_updates_received": sum(v.updates_received for v in viewers),
+            "viewer_latency_ms": _quantiles(viewer_latencies),
+            # In-process runs measure this process, so the simulated clients are included
+            "cpu_percent": round((cpu_after - cpu_before) / elapsed * 100, 1) if cpu_before is not None else None,
+            "channels_redis_cpu_percent": round((redis_cpu_after - redis_cpu_before) / elapsed * 100, 1),
+            "redis_ops_per_s": round(ops / elapsed, 1),
+            "redis_ops_per_connection": round(ops / connections, 1),
+            "redis_memory_per_connection": round((redis_after["used_memory"] - redis_before["used_memory"]) / connections),
+        }
+
+    def _cpu_seconds(self, options):
+        if not options["url"]:
+            return time.process_time()
+        if not options["server_pid"]:
+            return None
+        # utime + stime, in clock ticks (linux only)
+        with open(f"/proc/{options['server_pid']}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def _redis_cpu_seconds(self, client):
+        info = client.info("cpu")
+        return info["used_cpu_sys"] + info["used_cpu_user"]
+
+    def _report(self, r):
+        self.stdout.write(f"{r['rooms']} rooms x {r['editors_per_room']} editors ({r['mode']}, {r['channel_layer']}), {r['duration_s']}s")
+        self.stdout.write(f"Updates: {r['updates_sent']} sent, {r['updates_received']} received, {r['errors']} errors")
+        lat = r["latency_ms"]
+        self.stdout.write(f"Propagation latency: p50 {lat['p50']}ms  p95 {lat['p95']}ms  p99 {lat['p99']}ms  ({lat['samples']} samples)")
+        if r.get("viewers_per_room"):
+            lat = r["viewer_latency_ms"]
+            self.stdout.write(
+                f"Viewers: {r['viewers_per_room']} per room, {r['viewer_updates_received']} updates in {r['viewer_frames_received']} frames, "
+                f"latency p50 {lat['p50']}ms  p95 {lat['p95']}ms  p99 {lat['p99']}ms"
+            )
+        self.stdout.write(f"CPU: {r['cpu_percent']}%" if r["cpu_percent"] is not None else "CPU: not measured (pass --server-pid)")
+        self.stdout.write(
+            f"Redis: {r['redis_ops_per_s']} ops/s, {r['redis_ops_per_connection']} ops and "
+            f"{r['redis_memory_per_connection']} bytes per connection"
+        )
+        self.stdout.write(f"Channels redis CPU: {r['channels_redis_cpu_percent']}%")
+
+    def _compare(self, old, new):
+        self.stdout.write(f"Compared to {old['started_at']} ({old['channel_layer']}):")
+        rows = [
+            ("p50 ms", old["latency_ms"]["p50"], new["latency_ms"]["p50"]),
+            ("p95 ms", old["latency_ms"]["p95"], new["latency_ms"]["p95"]),
+            ("p99 ms", old["latency_ms"]["p99"], new["latency_ms"]["p99"]),
+            ("cpu %", old["cpu_percent"], new["cpu_percent"]),
+            ("redis ops/s", old["redis_ops_per_s"], new["redis_ops_per_s"]),
+            # Older results don't have it
+            ("channels redis cpu %", old.get("channels_redis_cpu_percent"), new["channels_redis_cpu_percent"]),
+            ("redis bytes/conn", old["redis_memory_per_connection"], new["redis_memory_per_connection"]),
+        ]
+        for name, before, after in rows:
+            if before is None or after is None:
+                continue
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            self.stdout.write(f"  {name:<22}{before:>12}{after:>12}{change:>10}")
@@ -0,0 +1,220 @@
+import asyncio
+import base64
+import json
+import random
+import statistics
+import time
+import y_py as Y
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from users.models import User
+from usergroups.models import Group
+from projects.models import Project
+from codes.models import Code
+from codes import consumers, redis_helpers, tasks
+from codes.consumers import YjsCodeConsumer
+from codes.redis_helpers import ydoc_key, text_key, text_view_fields, clear_project_keys, persist_ydoc_to_db, active_projects_shard
+from codes.tasks import snapshot_active_projects
+
+# fakeredis is what the benchmark runs against unless it's given --live
+try:
+    import fakeredis
+    import fakeredis.aioredis
+except ImportError:
+    fakeredis = None
+
+SIZES = {"1KB": 1024, "10KB": 10 * 1024, "100KB": 100 * 1024, "1MB": 1024 * 1024, "5MB": 5 * 1024 * 1024}
+CODE_LINE = "for i in range(10):\n    print(f'value {i}', i * 2)  # some code\n"
+
+def _code(length):
+    return (CODE_LINE * (length // len(CODE_LINE) + 1))[:length]
+
+def build_doc(size, history):
+    """A doc with size chars of code, written in history separate updates at random positions (like real typing)"""
+    ydoc = Y.YDoc()
+    text = ydoc.get_text("codetext")
+    chunk = max(1, size // history)
+    written = 0
+    while written < size:
+        piece = _code(min(chunk, size - written))
+        with ydoc.begin_transaction() as txn:
+            text.insert(txn, random.randint(0, written), piece)
+        written += len(piece)
+    return ydoc
+
+def _small_update(ydoc):
+    """One keystroke on ydoc, returned as the update a client would send"""
+    text = ydoc.get_text("codetext")
+    before = Y.encode_state_vector(ydoc)
+    with ydoc.begin_transaction() as txn:
+        text.insert(txn, random.randint(0, len(str(text))), "x")
+    return Y.encode_state_as_update(ydoc, before)
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmarks for the ydoc hot paths (applying an update, persisting, snapshotting, sync encoding) "
+        "by doc size and update history. Runs against fakeredis and rolls back the rows it makes, --live uses the "
+        "configured redis and database (the snapshot case then saves every active project)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1KB,10KB,100KB,1MB,5MB", help=f"Comma separated, out of {', '.join(SIZES)}")
+        parser.add_argument("--history", default="1,100,1000", help="Comma separated numbers of updates the doc was built from")
+        parser.add_argument("--repeat", type=int, default=7, help="Timed runs per case (after one warmup)")
+        parser.add_argument("--live", action="store_true", help="Use the configured redis and database instead of fakeredis and a rolled back transaction")
+        parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+        parser.add_argument("--baseline", help="Compare against a saved baseline")
+        parser.add_argument("--max-regression", type=float, default=20.0, help="Percent slower than the baseline a case can get before failing")
+        parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore slowdowns smaller than this, sub-microsecond cases are all noise")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [(name, SIZES[name]) for name in options["sizes"].split(",")]
+        except KeyError as e:
+            raise CommandError(f"Unknown size {e}, use {', '.join(SIZES)}")
+        histories = [int(h) for h in options["history"].split(",")]
+
+        if options["live"]:
+            results = self._run(sizes, histories, options["repeat"])
+        else:
+            self._use_fake_redis()
+            # Everything it writes goes away with the transaction. persist's atomic blocks become savepoints in
+            # here, so its numbers leave out the commit
+            with transaction.atomic():
+                results = self._run(sizes, histories, options["repeat"])
+                transaction.set_rollback(True)
+
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['save_baseline']}"))
+        if options["baseline"]:
+            self._check_regressions(results, options["baseline"], options["max_regression"], options["min_delta_ms"])
+
+    def _run(self, sizes, histories, repeat):
+        """Times every case against a throwaway project, returns {case: result}"""
+        # One loop for the whole run, the async redis client's connections belong to the loop they were opened on
+        self.loop = asyncio.new_event_loop()
+        user = project = None
+        results = {}
+        try:
+            user = User.objects.create_user(email=f"bench_ydoc_{time.time_ns()}@example.com")
+            group = Group.objects.create(owner=user, group_name="bench_ydoc")
+            group.group_members.add(user)
+            project = Project.objects.create(project_name="bench ydoc", group=group)
+            Code.objects.create(project=project, content="")
+
+            self.stdout.write(f"{'case':<34}{'median ms':>12}{'min ms':>12}{'doc bytes':>12}")
+            for size_name, size in sizes:
+                for history in histories:
+                    for name, timings, doc_bytes in self._run_case(project.id, size, history, repeat):
+                        key = f"{name}/{size_name}/h{history}"
+                        results[key] = {"median_ms": statistics.median(timings), "min_ms": min(timings), "doc_bytes": doc_bytes}
+                        self.stdout.write(f"{key:<34}{results[key]['median_ms']:>12.3f}{results[key]['min_ms']:>12.3f}{doc_bytes:>12}")
+        finally:
+            self.loop.close()
+            # Only matters with --live, otherwise the rollback takes care of it
+            if project is not None:
+                clear_project_keys([project.id])
+            if user is not None:
+                Group.all_objects.filter(owner=user).delete()
+                user.delete()
+        return results
+
+    def _use_fake_redis(self):
+        if fakeredis is None:
+            raise CommandError("The benchmark needs the fakeredis package (pip install fakeredis), or --live to use the configured redis")
+        server = fakeredis.FakeServer()
+        sync_client = fakeredis.FakeRedis(server=server)
+        async_client = fakeredis.aioredis.FakeRedis(server=server)
+        # Every module that imported the clients by name
+        redis_helpers.SYNC_REDIS = tasks.SYNC_REDIS = sync_client
+        redis_helpers.ASYNC_REDIS = consumers.ASYNC_REDIS = async_client
+
+    def _run_case(self, project_id, size, history, repeat):
+        """Yields (name, timings in ms, stored doc size) for every benchmark at this size/history"""
+        ydoc = build_doc(size, history)
+        doc_bytes = Y.encode_state_as_update(ydoc)
+        text = str(ydoc.get_text("codetext"))
+        sync_redis = redis_helpers.SYNC_REDIS
+
+        def reset():
+            sync_redis.set(ydoc_key(project_id), doc_bytes)
+            sync_redis.hset(text_key(project_id), mapping=text_view_fields(text))
+
+        # Applying one keystroke to the stored doc, the path every update message takes
+        consumer = YjsCodeConsumer()
+        client_doc = build_doc(0, 1)
+        Y.apply_update(client_doc, doc_bytes)
+
+        async def apply_runs():
+            timings = []
+            for _ in range(repeat + 1):
+                update = _small_update(client_doc)
+                start = time.perf_counter()
+                await consumer._apply_update_to_redis_ydoc(project_id, update)
+                timings.append((time.perf_counter() - start) * 1000)
+            return timings[1:]
+
+        reset()
+        yield "apply_update", self.loop.run_until_complete(apply_runs()), len(doc_bytes)
+
+        # Persisting, with a change every time so it actually writes
+        timings = []
+        for i in range(repeat + 1):
+            sync_redis.hset(text_key(project_id), mapping=text_view_fields(f"{text}#{i}"))
+            start = time.perf_counter()
+            persist_ydoc_to_db(project_id)
+            timings.append((time.perf_counter() - start) * 1000)
+        yield "persist", timings[1:], len(doc_bytes)
+
+        # A snapshot pass with this project active
+        timings = []
+        sync_redis.sadd(active_projects_shard(project_id), str(project_id))
+        for i in range(repeat + 1):
+            sync_redis.hset(text_key(project_id), mapping=text_view_fields(f"{text}@{i}"))
+            start = time.perf_counter()
+            snapshot_active_projects()
+            timings.append((time.perf_counter() - start) * 1000)
+        sync_redis.srem(active_projects_shard(project_id), str(project_id))
+        yield "snapshot", timings[1:], len(doc_bytes)
+
+        # Encoding the whole doc, which the apply path does after every update
+        timings = []
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            Y.encode_state_as_update(ydoc)
+            timings.append((time.perf_counter() - start) * 1000)
+        yield "encode_state", timings[1:], len(doc_bytes)
+
+        # Building the sync frame a client gets when it joins
+        reset()
+
+        async def sync_runs():
+            timings = []
+            for _ in range(repeat + 1):
+                start = time.perf_counter()
+                stored = await redis_helpers.ASYNC_REDIS.get(ydoc_key(project_id))
+                json.dumps({"type": "sync", "ydoc_b64": base64.b64encode(stored).decode()})
+                timings.append((time.perf_counter() - start) * 1000)
+            return timings[1:]
+
+        yield "sync_frame", self.loop.run_until_complete(sync_runs()), len(doc_bytes)
+
+    def _check_regressions(self, results, baseline_path, max_regression, min_delta_ms):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        failures = []
+        for key, result in results.items():
+            if key not in baseline:
+                continue
+            before, after = baseline[key]["median_ms"], result["median_ms"]
+            change = (after - before) / before * 100 if before else 0.0
+            if change > max_regression and after - before > min_delta_ms:
+                failures.append(f"{key}: {before:.3f}ms -> {after:.3f}ms ({change:+.1f}%)")
+
+        if failures:
+            raise CommandError(f"{len(failures)} case(s) regressed more than {max_regression}%:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS(f"No case regressed more than {max_regression}% against {baseline_path}"))
@@ -1,6 +1,5 @@
 from django.core.management.base import BaseCommand
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from codes import control
 from codes.tasks import snapshot_active_projects
 from codes.redis_helpers import SYNC_REDIS
 
@@ -17,13 +16,9 @@ class Command(BaseCommand):
 
         # Force disconnect all active websockets
         self.stdout.write("Forcing disconnect of all active websockets...")
-        channel_layer = get_channel_layer()
-        
-        async_to_sync(channel_layer.group_send)(
-            "global_connection_group",
-            {"type": "force_disconnect"}
-        )
-        self.stdout.write(self.style.SUCCESS("All active websockets disconnect"))
+        # Every server process is subscribed to the control channel and closes its own sockets
+        processes = control.publish("force_disconnect")
+        self.stdout.write(self.style.SUCCESS(f"All active websockets disconnect ({processes} server processes notified)"))
 
         # Flush Redis
         self.stdout.write("Flushing Redis...")
@@ -0,0 +1,153 @@
+import inspect
+import logging
+import os
+import time
+import redis
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, multiprocess
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Metrics for the realtime layer, served on /metrics (see codes/views.py).
+# With one server process everything lives in this process's registry. With several (uvicorn --workers, see serve.sh)
+# PROMETHEUS_MULTIPROC_DIR is set, every worker writes its numbers to files there and a scrape, whichever worker
+# answers it, adds them all up (see scrape_registry). Counters and histograms get summed, the gauges say how below.
+# The snapshot task runs in celery, so it leaves its numbers in redis and the collector at the bottom reads them back
+# when we get scraped
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Byte sizes from a tiny awareness update up to a 16MB doc
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# Anything else a client sends gets counted as "other", so a bad client can't create new label values
+MESSAGE_TYPES = {"update", "request_sync", "awareness", "chat_message", "join_voice", "leave_voice", "voice_signal", "ping"}
+
+# One series per worker (a pid label), for seeing how evenly the sockets are spread
+WS_CONNECTIONS = Gauge("pytogether_ws_connections", "Open websocket connections", multiprocess_mode="liveall")
+WS_ROOMS = Gauge("pytogether_ws_rooms", "Rooms with at least one connection in this process", multiprocess_mode="liveall")
+WS_MESSAGES = Counter("pytogether_ws_messages_total", "Websocket messages received", ["mtype"])   # "unparsed": not a JSON object with a type
+WS_HANDLER_SECONDS = Histogram("pytogether_ws_handler_seconds", "Time spent handling a message", ["mtype"], buckets=LATENCY_BUCKETS)
+UPDATE_BYTES = Histogram("pytogether_ydoc_update_bytes", "Size of incoming ydoc updates", buckets=SIZE_BUCKETS)
+SYNC_BYTES = Histogram("pytogether_sync_bytes", "Size of the full syncs sent to clients", ["kind"], buckets=SIZE_BUCKETS)
+# No project label, a per-room gauge can't be cleared in multiprocess mode and the series would pile up
+DOC_BYTES = Histogram("pytogether_ydoc_bytes", "Size of the ydocs written after an update", buckets=SIZE_BUCKETS)
+REDIS_SECONDS = Histogram("pytogether_redis_command_seconds", "Latency of redis commands from the event loop", ["command"], buckets=LATENCY_BUCKETS)
+GROUP_SEND_SECONDS = Histogram("pytogether_group_send_seconds", "Time to hand an event to the channel layer for a room", ["event"], buckets=LATENCY_BUCKETS)
+TEXT_VIEW_READS = Counter("pytogether_text_view_reads", "Live text reads, by whether the ydoc had to be decoded", ["source"])
+TEXT_VIEW_BYTES_SAVED = Counter("pytogether_text_view_bytes_saved", "Ydoc bytes that reads of the materialized text didn't decode")
+WS_RATE_LIMITED = Counter("pytogether_ws_rate_limited", "Messages over their rate limit (see codes/ratelimit.py)", ["mtype", "scope", "action"])
+WS_SEND_QUEUED = Gauge("pytogether_ws_send_queued", "Frames waiting in the sockets' send queues", multiprocess_mode="livesum")
+WS_SHED = Counter("pytogether_ws_shed", "Frames a slow socket never got (see codes/outbound.py)", ["kind", "reason"])
+WS_RESYNCS = Counter("pytogether_ws_resyncs", "Update backlogs replaced by a full sync")
+VIEWER_BATCH_UPDATES = Histogram("pytogether_viewer_batch_updates", "Updates per batch sent to a room's read-only viewers",
+                                 buckets=(1, 2, 5, 10, 25, 50, 100, 250))
+DB_EXECUTOR_QUEUED = Gauge("pytogether_db_executor_queued", "Calls waiting for a DB executor thread", multiprocess_mode="livesum")
+DB_EXECUTOR_RUNNING = Gauge("pytogether_db_executor_running", "Calls running on the DB executor", multiprocess_mode="livesum")
+DB_EXECUTOR_CALLS = Counter("pytogether_db_executor_calls", "Calls the DB executor finished")
+DB_EXECUTOR_MAX_WAIT = Gauge("pytogether_db_executor_max_wait_seconds", "Longest a call waited for a DB executor thread",
+                             multiprocess_mode="livemax")
+
+_local_rooms = {}   # project id -> connections to it in this process
+
+def connection_opened(project_id):
+    WS_CONNECTIONS.inc()
+    _local_rooms[project_id] = _local_rooms.get(project_id, 0) + 1
+    WS_ROOMS.set(len(_local_rooms))
+
+def connection_closed(project_id):
+    WS_CONNECTIONS.dec()
+    remaining = _local_rooms.get(project_id, 1) - 1
+    if remaining > 0:
+        _local_rooms[project_id] = remaining
+    else:
+        _local_rooms.pop(project_id, None)
+    WS_ROOMS.set(len(_local_rooms))
+
+def message_label(mtype):
+    return mtype if mtype in MESSAGE_TYPES else "other"
+
+class _TimedPipeline:
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+
+    def __getattr__(self, name):
+        return getattr(self._pipeline, name)
+
+    async def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await self._pipeline.execute(*args, **kwargs)
+        finally:
+            REDIS_SECONDS.labels("pipeline").observe(time.perf_counter() - start)
+
+class TimedRedis:
+    """Wraps the async redis client so every command's latency ends up in REDIS_SECONDS"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name == "pipeline":
+            return lambda *args, **kwargs: _TimedPipeline(attr(*args, **kwargs))
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if not inspect.isawaitable(result):
+                return result
+            return _observe_redis(name, result)
+        return timed
+
+async def _observe_redis(command, awaitable):
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        REDIS_SECONDS.labels(command).observe(time.perf_counter() - start)
+
+class RealtimeStatsCollector:
+    """Numbers we don't keep in this process, the snapshot task's (from redis)"""
+
+    def describe(self):
+        # Otherwise registering would call collect() right away, before redis_helpers is even imported
+        return []
+
+    def collect(self):
+        # Imported here, redis_helpers imports this module for TimedRedis
+        from .redis_helpers import SYNC_REDIS, SNAPSHOT_STATS
+
+        try:
+            snapshot = {k.decode(): float(v) for k, v in SYNC_REDIS.hgetall(SNAPSHOT_STATS).items()}
+        except redis.RedisError as e:
+            # Still serve the in-process metrics, a missing series is better than a zero
+            logger.warning("couldn't read stats from redis", extra={"event": "metrics_redis_error", "error": str(e)})
+            return
+
+        yield GaugeMetricFamily("pytogether_snapshot_last_duration_seconds", "How long the last snapshot pass took",
+                                value=snapshot.get("last_duration", 0))
+        yield GaugeMetricFamily("pytogether_snapshot_last_projects", "Projects saved by the last snapshot pass",
+                                value=snapshot.get("last_projects", 0))
+        yield GaugeMetricFamily("pytogether_snapshot_last_run_timestamp_seconds", "When the last snapshot pass finished",
+                                value=snapshot.get("last_run", 0))
+        yield CounterMetricFamily("pytogether_snapshot_runs", "Snapshot passes", value=snapshot.get("runs", 0))
+        yield CounterMetricFamily("pytogether_snapshot_seconds", "Total time spent in snapshot passes",
+                                  value=snapshot.get("total_duration", 0))
+
+REGISTRY.register(RealtimeStatsCollector())
+
+def scrape_registry():
+    """What /metrics serves, every worker's metrics in multiprocess mode"""
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(RealtimeStatsCollector())
+    return registry
+
+def process_exiting():
+    """Drops this worker's live gauges, the other workers keep serving theirs"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 04:04
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codes', '0001_initial'),
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='code',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='code',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='code_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='code',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['content'], name='code_content_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        # Index the code that already exists
+        migrations.RunSQL(
+            "UPDATE codes_code SET search_vector = to_tsvector('simple', content)",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,11 +1,23 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from projects.models import Project
 
+SEARCH_CONFIG = "simple"    # code isn't english, so no stemming or stop words
+
 # Model for the current code
 class Code(models.Model):
     project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name="code")
     content = models.TextField(blank=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)     # kept up to date by persist_ydoc_to_db
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="code_search_vector_idx"),
+            # Trigram index so substring searches like "input(" don't have to scan every row
+            GinIndex(fields=["content"], name="code_content_trgm_idx", opclasses=["gin_trgm_ops"]),
+        ]
 
     def __str__(self):
         return f"Code for project {self.project_id}"
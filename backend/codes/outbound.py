@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Every socket's outgoing frames go through one of these instead of straight to self.send. A slow client used to
+# block its consumer in send(), then its channel layer inbox filled up and channels_redis quietly dropped whatever
+# came next, doc updates included. Now the consumer only queues, a writer task does the sending, and the queue
+# decides what to give up on when the client can't keep up:
+# - doc updates are never dropped. Past WS_SEND_QUEUE_RESYNC_AFTER of them the backlog gets replaced by one full sync,
+#   built when it's its turn, so it has everything the backlog had (and whatever came in since)
+# - awareness is kept per sender, a newer one replaces the one waiting. It's the first thing to go when the
+#   queue backs up
+# - everything else (chat, roster, voice) is capped at WS_SEND_QUEUE_MAX_MESSAGES, the oldest go past that.
+#   Roster and voice updates are keyed, only the latest of each gets sent
+
+_RESYNC = object()      # stands in for the doc backlog, see put_update
+
+class SendQueue:
+    def __init__(self, send, sync_frame):
+        self._send = send                   # async, takes the frame text
+        self._sync_frame = sync_frame       # async, returns a full sync frame
+        self._doc = deque()
+        self._messages = OrderedDict()      # key -> frame, unkeyed frames get a running number
+        self._awareness = OrderedDict()     # sender -> frame
+        self._seq = 0
+        self._depth = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+        self._doc.clear()
+        self._messages.clear()
+        self._awareness.clear()
+        self._changed()
+
+    def put_update(self, frame):
+        if len(self._doc) >= settings.WS_SEND_QUEUE_RESYNC_AFTER:
+            shed = sum(1 for f in self._doc if f is not _RESYNC) + 1
+            self._doc.clear()
+            self._doc.append(_RESYNC)
+            metrics.WS_SHED.labels("update", "resync").inc(shed)
+            metrics.WS_RESYNCS.inc()
+            logger.info("socket fell behind, resyncing it", extra={"event": "ws.resync", "updates_shed": shed})
+        else:
+            self._doc.append(frame)
+        # Cursors can wait until the doc caught up
+        if len(self._doc) >= settings.WS_SEND_QUEUE_AWARENESS_BACKLOG:
+            self._drop_awareness("backlog")
+        self._changed()
+
+    def put_awareness(self, sender, frame):
+        if len(self._doc) >= settings.WS_SEND_QUEUE_AWARENESS_BACKLOG:
+            metrics.WS_SHED.labels("awareness", "backlog").inc()
+            return
+        if sender in self._awareness:
+            metrics.WS_SHED.labels("awareness", "coalesced").inc()
+        self._awareness[sender] = frame
+        self._changed()
+
+    def put_message(self, frame, key=None):
+        if key is None:
+            self._seq += 1
+            key = self._seq
+        elif key in self._messages:
+            # Only the latest one matters, and it goes where the newest would
+            del self._messages[key]
+            metrics.WS_SHED.labels("message", "coalesced").inc()
+        if len(self._messages) >= settings.WS_SEND_QUEUE_MAX_MESSAGES:
+            self._drop_awareness("overflow")
+            self._messages.popitem(last=False)
+            metrics.WS_SHED.labels("message", "overflow").inc()
+        self._messages[key] = frame
+        self._changed()
+
+    def _drop_awareness(self, reason):
+        if self._awareness:
+            metrics.WS_SHED.labels("awareness", reason).inc(len(self._awareness))
+            self._awareness.clear()
+
+    def _changed(self):
+        depth = len(self._doc) + len(self._messages) + len(self._awareness)
+        metrics.WS_SEND_QUEUED.inc(depth - self._depth)
+        self._depth = depth
+        if depth:
+            self._wakeup.set()
+
+    def _pop(self):
+        if self._doc:
+            return self._doc.popleft()
+        if self._messages:
+            return self._messages.popitem(last=False)[1]
+        if self._awareness:
+            return self._awareness.popitem(last=False)[1]
+        return None
+
+    async def _run(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while (frame := self._pop()) is not None:
+                    self._changed()
+                    if frame is _RESYNC:
+                        frame = await self._sync_frame()
+                    await self._send(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket went away under us, disconnect cleans up the rest
+            logger.debug("send queue stopped", extra={"event": "ws.send_queue_stopped"}, exc_info=True)
@@ -0,0 +1,113 @@
+import re
+import time
+from django.conf import settings
+
+# Token buckets for websocket messages (WS_RATE_LIMITS), one per message type for every connection plus one per type
+# for every room, so a single tab can't flood a room and a room full of tabs can't flood the server.
+# The room buckets are per process, with several nodes/workers a room gets its limit on each of them
+# (with ROOM_AFFINITY_ENABLED most of a room is on one node anyway).
+# Everything here runs before the message gets decoded, the type comes from peek_type
+
+# Our clients send the type as the first key (JSON.stringify keeps the order we wrote it in). Messages that don't
+# still work, the consumer decodes them to find the type
+_TYPE_PREFIX = re.compile(r'\s*\{\s*"type"\s*:\s*"([A-Za-z_]{1,32})"')
+
+_room_buckets = {}  # room -> {mtype: TokenBucket}
+_room_refs = {}     # room -> connections in this process using its buckets
+
+def peek_type(text):
+    """The message type without parsing the message, or None if it doesn't start with one"""
+    match = _TYPE_PREFIX.match(text)
+    return match.group(1) if match else None
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def has_token(self):
+        self._refill()
+        return self.tokens >= 1
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def wait(self):
+        """How long until there's a token, without taking it"""
+        self._refill()
+        return (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+
+    def reserve(self):
+        """Takes a token even if there isn't one yet, returns how long until it would have been there"""
+        self.take()
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+class MessageLimiter:
+    """A connection's buckets, and its share of the room's"""
+
+    def __init__(self, room):
+        self.room = room
+        self._buckets = {}
+        self._room = _room_buckets.setdefault(room, {})
+        _room_refs[room] = _room_refs.get(room, 0) + 1
+
+    def close(self):
+        remaining = _room_refs.get(self.room, 1) - 1
+        if remaining > 0:
+            _room_refs[self.room] = remaining
+        else:
+            _room_refs.pop(self.room, None)
+            _room_buckets.pop(self.room, None)
+
+    def _bucket_pair(self, mtype):
+        """The connection's and the room's bucket for this type, the room's is None if the type has no room limit"""
+        key = mtype if mtype in settings.WS_RATE_LIMITS else "other"
+        conn = self._buckets.get(key)
+        if conn is None:
+            limits = settings.WS_RATE_LIMITS[key]
+            conn = self._buckets[key] = TokenBucket(limits["rate"], limits["burst"])
+            if key not in self._room and limits.get("room_rate"):
+                self._room[key] = TokenBucket(limits["room_rate"], limits["room_burst"])
+        return conn, self._room.get(key)
+
+    def acquire(self, mtype):
+        """
+        Returns (0, None) if the message can go through now. Otherwise (wait, scope), scope being whose bucket
+        ran out ("connection" or "room"). Types in WS_RATE_LIMIT_DELAYED get their token anyway and wait is how long
+        the caller should hold the message back, only a connection that's more than WS_RATE_LIMIT_MAX_DELAY behind
+        gets closed. Anything else should be dropped. A message its own connection can't pay for never costs the room
+        """
+        conn, room = self._bucket_pair(mtype)
+        if mtype in settings.WS_RATE_LIMIT_DELAYED:
+            conn_wait = conn.reserve()
+            if conn_wait > settings.WS_RATE_LIMIT_MAX_DELAY:
+                return conn_wait, "connection"
+            room_wait = room.wait() if room else 0.0
+            if room_wait > settings.WS_RATE_LIMIT_MAX_DELAY:
+                # A busy room isn't the sender's fault, so it only gets slowed down as much as we ever hold an update
+                # back. Without taking a token, or the room would sink further behind with every message
+                room_wait = settings.WS_RATE_LIMIT_MAX_DELAY
+            elif room:
+                room.take()
+            if conn_wait or room_wait:
+                return max(conn_wait, room_wait), "connection" if conn_wait >= room_wait else "room"
+            return 0, None
+
+        if not conn.has_token():
+            return 1, "connection"
+        if room and not room.has_token():
+            return 1, "room"
+        conn.take()
+        if room:
+            room.take()
+        return 0, None
@@ -1,61 +1,231 @@
-import os
+import hashlib
+import logging
 import redis
 import redis.asyncio as aioredis
+from redis.cluster import RedisCluster
+from redis.asyncio.cluster import RedisCluster as AsyncRedisCluster
+from asgiref.sync import sync_to_async
 from y_py import YDoc, apply_update
 
+from django.conf import settings
 from django.db import transaction
+from django.contrib.postgres.search import SearchVector
 from projects.models import Project
-from .models import Code
+from .models import Code, SEARCH_CONFIG
+from .metrics import TimedRedis, TEXT_VIEW_READS, TEXT_VIEW_BYTES_SAVED
+from backend.logging_utils import span
 
-REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379/0")
-ASYNC_REDIS = aioredis.from_url(REDIS_URL)
-SYNC_REDIS = redis.from_url(REDIS_URL)
+logger = logging.getLogger(__name__)
 
-ACTIVE_PROJECTS_SET = "active_projects"     # set of all active projects (projects with at least one active editor)
+# The doc store gets its own redis/connections (REDIS_DOCS_URL, sized in REDIS_POOLS), apart from the cache, celery and the channel layer
+_pool = dict(settings.REDIS_POOLS["docs"])
+if settings.REDIS_CLUSTER:
+    # The cluster clients keep a pool per node and don't have a blocking one
+    _pool.pop("timeout")
+    ASYNC_REDIS = TimedRedis(AsyncRedisCluster.from_url(settings.REDIS_DOCS_URL, **_pool))
+    SYNC_REDIS = RedisCluster.from_url(settings.REDIS_DOCS_URL, **_pool)
+else:
+    # the consumers' client, timed for /metrics
+    ASYNC_REDIS = TimedRedis(aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool.from_url(settings.REDIS_DOCS_URL, **_pool)))
+    SYNC_REDIS = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(settings.REDIS_DOCS_URL, **_pool))
+
+# Key layout: every key of a project has its id as a hash tag ({123}), so on a Redis Cluster they all land in the same slot
+# and the multi-key pipelines/transactions/scripts on them keep working. The global keys below are only ever used one at a time.
+# Changing the layout needs no migration, deploys go through disconnect_users which snapshots and flushes redis anyway
+SNAPSHOT_STATS = "snapshot_stats"           # duration/count of the snapshot passes (they run in celery, /metrics reads them from here)
+ROOM_NODES = "room_nodes"                   # hash of node id -> url clients can reach it on (room affinity redirects)
 
 def ydoc_key(project_id):
-    return f"project_ydoc:{project_id}"     # contains the ydoc bytes for a specific project
+    return f"project_ydoc:{{{project_id}}}"     # contains the ydoc bytes for a specific project
 
 def active_set_key(project_id):
-    return f"project_active:{project_id}"   # list of all user ids currently in a room
+    return f"project_active:{{{project_id}}}"   # list of all user ids currently in a room
 
 def voice_room_key(project_id):
-    return f"voice_room:{project_id}"       # voice chat participants
+    return f"voice_room:{{{project_id}}}"       # voice chat participants
 
 def user_color_key(user_id):
     return f"user_color:{user_id}"          # colors for each user
 
+def room_owner_key(project_id):
+    return f"room_owner:{{{project_id}}}"       # lease: id of the node that owns the room's live doc
+
+def persist_lock_key(project_id):
+    return f"lock:project_persist:{{{project_id}}}"
+
+def text_key(project_id):
+    return f"project_text:{{{project_id}}}"     # plaintext of the ydoc (text, sha1, length), kept up to date as edits arrive
+
+def ydoc_clone_base_key(project_id):
+    return f"ydoc_clone_base:{{{project_id}}}"  # key of the template a cloned project's ydoc gets copied from on first open
+
+def ydoc_template_key(project_id, digest):
+    return f"ydoc_template:{{{project_id}}}:{digest}"   # snapshot of a project's ydoc that clones of it share until opened
+
+# The set of active projects (at least one editor) used to be one key, which would put every join/leave on one cluster node.
+# It's split over ACTIVE_PROJECTS_SHARDS sets now, the snapshot task reads all of them
+def active_projects_key(shard):
+    return f"active_projects:{{s{shard}}}"
+
+def active_projects_shard(project_id):
+    return active_projects_key(int(project_id) % settings.ACTIVE_PROJECTS_SHARDS)
+
+def active_project_ids():
+    """Ids of every active project, across all the shards"""
+    pipe = SYNC_REDIS.pipeline(transaction=False)
+    for shard in range(settings.ACTIVE_PROJECTS_SHARDS):
+        pipe.smembers(active_projects_key(shard))
+    return {int(pid) for members in pipe.execute() for pid in members}
+
+def text_view_fields(text):
+    """The fields stored in the materialized text hash"""
+    return {"text": text, "sha1": hashlib.sha1(text.encode()).hexdigest(), "length": len(text)}
+
+def set_text_view(pipe, project_id, text):
+    """Queues writing a project's materialized text on pipe. It expires TEXT_VIEW_TTL after the last edit, readers decode the ydoc again after that"""
+    pipe.hset(text_key(project_id), mapping=text_view_fields(text))
+    pipe.expire(text_key(project_id), settings.TEXT_VIEW_TTL)
+
+def decode_ydoc_text(ydoc_bytes):
+    ydoc = YDoc()
+    apply_update(ydoc, ydoc_bytes)
+    return str(ydoc.get_text("codetext"))
+
+def get_live_text(project_id):
+    """
+    Returns the current text of a live project as {"text", "sha1", "length"}, or None if it isn't in redis.
+    Reads the materialized text (one round trip, no y_py) and only falls back to decoding the ydoc if it's missing.
+    """
+    pipe = SYNC_REDIS.pipeline(transaction=False)
+    pipe.hgetall(text_key(project_id))
+    pipe.strlen(ydoc_key(project_id))
+    fields, ydoc_len = pipe.execute()
+
+    if fields:
+        view = {k.decode(): v.decode() for k, v in fields.items()}
+        view["length"] = int(view["length"])
+        # Counted in process, a write to redis would cost every read a second round trip
+        TEXT_VIEW_READS.labels("materialized").inc()
+        TEXT_VIEW_BYTES_SAVED.inc(ydoc_len)
+        return view
+
+    if not ydoc_len:
+        return None
+
+    # The doc was written before the text view existed (or it expired, see TEXT_VIEW_TTL), decode it once and backfill
+    bytes_val = SYNC_REDIS.get(ydoc_key(project_id))
+    if not bytes_val:
+        return None
+    text = decode_ydoc_text(bytes_val)
+    pipe = SYNC_REDIS.pipeline(transaction=False)
+    set_text_view(pipe, project_id, text)
+    pipe.execute()
+    TEXT_VIEW_READS.labels("decoded").inc()
+    return text_view_fields(text)
+
+async def aget_live_text(project_id):
+    """Async version of get_live_text, for async views. Falls back to the sync one (in a thread) if it has to decode"""
+    pipe = ASYNC_REDIS.pipeline(transaction=False)
+    pipe.hgetall(text_key(project_id))
+    pipe.strlen(ydoc_key(project_id))
+    fields, ydoc_len = await pipe.execute()
+
+    if fields:
+        view = {k.decode(): v.decode() for k, v in fields.items()}
+        view["length"] = int(view["length"])
+        # Counted in process, a write to redis would cost every read a second round trip
+        TEXT_VIEW_READS.labels("materialized").inc()
+        TEXT_VIEW_BYTES_SAVED.inc(ydoc_len)
+        return view
+
+    if not ydoc_len:
+        return None
+    return await sync_to_async(get_live_text)(project_id)
+
+def snapshot_ydoc_template(project_id):
+    """Stores one shared copy of a live project's ydoc for its clones, returns its key (or None if it isn't live)"""
+    bytes_val = SYNC_REDIS.get(ydoc_key(project_id))
+    if not bytes_val:
+        return None
+    key = ydoc_template_key(project_id, hashlib.sha1(bytes_val).hexdigest()[:16])
+    SYNC_REDIS.set(key, bytes_val, ex=settings.YDOC_TEMPLATE_TTL)
+    return key
+
+def register_ydoc_clones(template_key, project_ids):
+    """Points every clone at the shared template, instead of seeding a ydoc per clone. They expire with the template"""
+    if project_ids:
+        pipe = SYNC_REDIS.pipeline(transaction=False)
+        for pid in project_ids:
+            pipe.set(ydoc_clone_base_key(pid), template_key, ex=settings.YDOC_TEMPLATE_TTL)
+        pipe.execute()
+
+# Copies the template (ARGV[2]) into the clone's ydoc, unless another connection to it got there first.
+# The clone base only goes away once the ydoc is there, so a connection in between always sees one of them.
+# The template itself is in the source's slot, so it gets read beforehand and passed in
+_CLAIM_CLONE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    redis.call('set', KEYS[2], ARGV[2], 'NX')
+    redis.call('del', KEYS[1])
+end
+return redis.call('get', KEYS[2])
+"""
+
+async def claim_cloned_ydoc(project_id):
+    """Copy-on-write: gives a cloned project its own copy of the template ydoc, returns it (or None if it isn't a clone)"""
+    base_key = ydoc_clone_base_key(project_id)
+    # Read together, the caller's ydoc read might be from before another connection claimed it
+    pipe = ASYNC_REDIS.pipeline(transaction=True)
+    pipe.get(base_key)
+    pipe.get(ydoc_key(project_id))
+    template_key, ydoc_bytes = await pipe.execute()
+    if ydoc_bytes or not template_key:
+        return ydoc_bytes
+    template = await ASYNC_REDIS.get(template_key)
+    if not template:
+        # Template expired, the client will start from the cloned code instead
+        return None
+    return await ASYNC_REDIS.eval(_CLAIM_CLONE, 2, base_key, ydoc_key(project_id), template_key, template)
+
+def clear_project_keys(project_ids):
+    """Removes every realtime key of these projects in one pipeline (used when they get deleted)"""
+    if not project_ids:
+        return
+    pipe = SYNC_REDIS.pipeline(transaction=False)
+    for pid in project_ids:
+        pipe.delete(ydoc_key(pid), text_key(pid), ydoc_clone_base_key(pid), active_set_key(pid), voice_room_key(pid))
+        pipe.srem(active_projects_shard(pid), str(pid))
+    pipe.execute()
+
 def persist_ydoc_to_db(project_id):
     """Saves the code to the database"""
     try:
-        # Django ORM is sync, so we need to use redis synchronously too
-        bytes_val = SYNC_REDIS.get(ydoc_key(project_id))
-        if not bytes_val:
-            return
-        
-        ydoc = YDoc()
-        apply_update(ydoc, bytes_val)
-        t = ydoc.get_text("codetext")
-        text = str(t)
-
-        # Make the db operation atomic just incase
-        with transaction.atomic():
-            project = Project.objects.select_for_update().get(id=project_id)
-            code, _ = Code.objects.get_or_create(project=project)
-
-            # Don't save if no changes made
-            if code.content == text:
+        with span(logger, "persist", project_id=project_id, saved=False) as fields:
+            # Django ORM is sync, so we need to use redis synchronously too
+            live = get_live_text(project_id)
+            if live is None:
                 return
-            code.content = text
-            code.save()
+            text = live["text"]
+
+            # Make the db operation atomic just incase
+            with transaction.atomic():
+                # of=("self",) so we don't also lock the group row the manager joins on
+                project = Project.objects.select_for_update(of=("self",)).get(id=project_id)
+                code, _ = Code.objects.get_or_create(project=project)
+
+                # Don't save if no changes made
+                if code.content == text:
+                    return
+                code.content = text
+                code.save()
+
+                # Keep the search index in sync with what we just saved
+                Code.objects.filter(pk=code.pk).update(search_vector=SearchVector("content", config=SEARCH_CONFIG))
 
-        print(f"Saved {len(text)} chars to DB")
+            fields.update(saved=True, chars=len(text))
 
     except Project.DoesNotExist:
         # project removed; cleanup redis keys
-        SYNC_REDIS.delete(ydoc_key(project_id))
-        SYNC_REDIS.srem(ACTIVE_PROJECTS_SET, str(project_id))
-        SYNC_REDIS.delete(active_set_key(project_id))
+        clear_project_keys([project_id])
 
-    except Exception as e:
-        print(f"Error persisting YDoc to DB: {e}")
\ No newline at end of file
+    except Exception:
+        logger.exception("error persisting ydoc to db", extra={"event": "persist_error", "project_id": project_id})
\ No newline at end of file
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from collections import deque
+import y_py as Y
+from y_py import YDoc, apply_update
+from django.conf import settings
+
+from . import metrics
+from .redis_helpers import ASYNC_REDIS, ROOM_NODES, ydoc_key, set_text_view, room_owner_key, claim_cloned_ydoc
+
+logger = logging.getLogger(__name__)
+
+# Room affinity (ROOM_AFFINITY_ENABLED). With several server nodes behind nginx, every node in a room used to read,
+# decode and rewrite the same ydoc from redis on every keystroke. Now one node owns each room, a redis lease
+# (room_owner:{pid} -> NODE_ID) says which. The owner keeps the doc decoded in memory and applies updates to it directly.
+# Connections that land somewhere else get a redirect to the owner and are closed with 4010 (PyIDE.jsx follows it).
+# Redis still gets every change written through, for persisting/exports and for whoever owns the room next
+
+# Only touch the lease if it's still ours
+_RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('expire', KEYS[1], ARGV[2]) end return 0"
+_RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+_rooms = {}     # project id -> LocalRoom, the rooms this process owns
+
+async def claim_room(project_id):
+    """Takes the lease if nobody has it, returns the id of the node that owns the room"""
+    key = room_owner_key(project_id)
+    while True:
+        if await ASYNC_REDIS.set(key, settings.NODE_ID, nx=True, ex=settings.ROOM_LEASE_TTL):
+            if settings.NODE_URL:
+                await ASYNC_REDIS.hset(ROOM_NODES, settings.NODE_ID, settings.NODE_URL)
+            return settings.NODE_ID
+        owner = await ASYNC_REDIS.get(key)
+        # None means it expired in between, try again
+        if owner is not None:
+            return owner.decode()
+
+async def node_url(node_id):
+    url = await ASYNC_REDIS.hget(ROOM_NODES, node_id)
+    return url.decode() if url else None
+
+async def acquire_room(project_id, consumer):
+    """
+    Returns (LocalRoom, owner id) if this node owns the room, with the consumer added to it,
+    or (None, owner id) if another node does
+    """
+    owner = await claim_room(project_id)
+    if owner != settings.NODE_ID:
+        return None, owner
+
+    room = _rooms.get(project_id)
+    if room is None:
+        room = _rooms[project_id] = LocalRoom(project_id)
+        room.start()
+    room.consumers.add(consumer)
+    await room.load()
+    return room, owner
+
+async def release_room(room, consumer):
+    room.consumers.discard(consumer)
+    if room.consumers or _rooms.get(room.project_id) is not room:
+        return
+    del _rooms[room.project_id]
+    room.stop()
+    await room.write()
+    # Someone might have joined again while we were writing, then the new room keeps the lease
+    if room.project_id not in _rooms:
+        await ASYNC_REDIS.eval(_RELEASE, 1, room_owner_key(room.project_id), settings.NODE_ID)
+
+async def release_all():
+    """Writes and hands back every room this process still owns (the worker is shutting down)"""
+    for room in list(_rooms.values()):
+        room.consumers.clear()
+        try:
+            await release_room(room, None)
+        except Exception:
+            logger.exception("couldn't release room on shutdown", extra={"event": "room.release_error", "project_id": room.project_id})
+
+class LocalRoom:
+    """The live doc of a room this node owns, shared by all of its connections in this process"""
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.ydoc = None                # stays None until someone sends the first update, clients start from the saved code
+        self.consumers = set()
+        self.loaded = False
+        self._load_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._dirty = False
+        self._seen = deque(maxlen=64)   # updates from non-owner connections we already applied (see apply_remote)
+        self._lease_task = None
+
+    def start(self):
+        self._lease_task = asyncio.create_task(self._keep_lease())
+
+    def stop(self):
+        if self._lease_task:
+            self._lease_task.cancel()
+
+    async def load(self):
+        async with self._load_lock:
+            if self.loaded:
+                return
+            # Projects cloned from a live project get a copy of its ydoc the first time they're opened
+            ydoc_bytes = await ASYNC_REDIS.get(ydoc_key(self.project_id)) or await claim_cloned_ydoc(self.project_id)
+            if ydoc_bytes:
+                self.ydoc = YDoc()
+                apply_update(self.ydoc, ydoc_bytes)
+            self.loaded = True
+
+    def state(self):
+        """The whole doc as one update (for syncs), or None if there isn't one yet"""
+        return Y.encode_state_as_update(self.ydoc) if self.ydoc is not None else None
+
+    async def apply(self, update_bytes):
+        if self.ydoc is None:
+            self.ydoc = YDoc()
+        apply_update(self.ydoc, update_bytes)
+        self._dirty = True
+        await self.write()
+
+    async def apply_remote(self, update_b64, update_bytes):
+        """
+        An update a connection on another node applied to redis itself (clients only end up there when a redirect
+        didn't get them here, see the consumer). Every one of our connections in the room gets the broadcast, apply it once
+        """
+        if update_b64 in self._seen:
+            return
+        self._seen.append(update_b64)
+        await self.apply(update_bytes)
+
+    async def write(self):
+        """Writes the doc (and its text) through to redis. A write that waited on another one might find its change already written"""
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            new_bytes = Y.encode_state_as_update(self.ydoc)
+            metrics.DOC_BYTES.observe(len(new_bytes))
+            pipe = ASYNC_REDIS.pipeline(transaction=True)
+            pipe.set(ydoc_key(self.project_id), new_bytes)
+            set_text_view(pipe, self.project_id, str(self.ydoc.get_text("codetext")))
+            await pipe.execute()
+
+    async def _keep_lease(self):
+        key = room_owner_key(self.project_id)
+        while True:
+            await asyncio.sleep(settings.ROOM_LEASE_TTL / 3)
+            try:
+                if await ASYNC_REDIS.eval(_RENEW, 1, key, settings.NODE_ID, settings.ROOM_LEASE_TTL):
+                    continue
+                # It expired (we were stalled, or redis lost it), take it back unless someone else already did
+                owner = await claim_room(self.project_id)
+            except Exception:
+                logger.exception("couldn't renew room lease", extra={"event": "room.lease_error", "project_id": self.project_id})
+                continue
+            if owner != settings.NODE_ID:
+                logger.warning("lost room lease", extra={"event": "room.lease_lost", "project_id": self.project_id, "owner": owner})
+                if _rooms.get(self.project_id) is self:
+                    del _rooms[self.project_id]
+                url = await node_url(owner)
+                for consumer in list(self.consumers):
+                    if url:
+                        await consumer.redirect(owner, url)
+                    else:
+                        # Nowhere to send them, they carry on from redis like an affinity miss
+                        consumer.local_room = None
+                        self.consumers.discard(consumer)
+                return
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Code
+from projects.models import Project
+from projects.snippet_cache import invalidate_snippet
+from usergroups.cache_helpers import bump_versions_on_commit, group_projects_version_key
+
+# The project listing shows each code's updated_at, so saving code (autosave included) invalidates the group's listing.
+# This is also what drops the cached snippet whenever persist_ydoc_to_db writes new content
+
+@receiver(post_save, sender=Code)
+@receiver(post_delete, sender=Code)
+def code_changed(sender, instance, **kwargs):
+    invalidate_snippet(instance.project_id)
+    try:
+        group_id = instance.project.group_id
+    except Project.DoesNotExist:
+        # Deleted as part of the project's cascade, the project signal takes care of it
+        return
+    bump_versions_on_commit([group_projects_version_key(group_id)])
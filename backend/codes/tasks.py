@@ -1,21 +1,23 @@
+import logging
+import time
 from celery import shared_task
 
-from .redis_helpers import persist_ydoc_to_db, SYNC_REDIS, ACTIVE_PROJECTS_SET
+from backend.logging_utils import log_span
+
+from .redis_helpers import persist_ydoc_to_db, active_project_ids, persist_lock_key, SYNC_REDIS, SNAPSHOT_STATS
+
+logger = logging.getLogger(__name__)
 
 @shared_task
 def snapshot_active_projects():
     """Loop through all active projects and save their code to the db"""
-    project_ids = SYNC_REDIS.smembers(ACTIVE_PROJECTS_SET)
+    start = time.perf_counter()
+    project_ids = active_project_ids()
     processed = []
 
-    for id in project_ids:
-        try:
-            pid = int(id)
-        except Exception:
-            continue
-
+    for pid in project_ids:
         # A lock isn't really necessary yet, but it's nice to have when we scale
-        lock = SYNC_REDIS.lock(f"lock:project_persist:{pid}", timeout=10)
+        lock = SYNC_REDIS.lock(persist_lock_key(pid), timeout=10)
         got = lock.acquire(blocking=False)
         if not got:
             continue
@@ -27,6 +29,15 @@ def snapshot_active_projects():
                 lock.release()
             except Exception:
                 pass
-            
+
+    # Celery isn't scraped, so leave the numbers where /metrics can find them
+    duration = time.perf_counter() - start
+    pipe = SYNC_REDIS.pipeline(transaction=False)
+    pipe.hset(SNAPSHOT_STATS, mapping={"last_duration": duration, "last_projects": len(processed), "last_run": time.time()})
+    pipe.hincrby(SNAPSHOT_STATS, "runs", 1)
+    pipe.hincrbyfloat(SNAPSHOT_STATS, "total_duration", duration)
+    pipe.execute()
+    log_span(logger, "snapshot", duration, active=len(project_ids), saved=len(processed))
+
     return processed
     
@@ -1,3 +1,50 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core import signing
+from django.test import TransactionTestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.jwt_auth_middleware import JWTAuthMiddleware
+from projects.models import Project
+from usergroups.models import Group
+from users.models import User
+from .executors import DB_EXECUTOR
+from .routing import websocket_urlpatterns
+
+# The executor's threads have their own DB connections, so the rows have to be committed (TransactionTestCase).
+# Both connects get turned away before the consumer touches redis
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ConsumerDBExecutorTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner@example.com", "pw")
+        self.outsider = User.objects.create_user("outsider@example.com", "pw")
+        self.group = Group.objects.create(owner=self.owner, group_name="g")
+        self.group.group_members.add(self.owner)
+        self.project = Project.objects.create(project_name="p", group=self.group)
+        self.app = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    async def _connect(self, query):
+        communicator = WebsocketCommunicator(self.app, f"/ws/groups/{self.group.id}/projects/{self.project.id}/code/?{query}")
+        with mock.patch.object(DB_EXECUTOR, "run", wraps=DB_EXECUTOR.run) as run:
+            connected, code = await communicator.connect()
+        await communicator.disconnect()
+        return connected, code, run
+
+    async def test_membership_check_runs_on_executor(self):
+        token = RefreshToken.for_user(self.outsider).access_token
+        connected, code, run = await self._connect(f"token={token}")
+        self.assertFalse(connected)
+        self.assertEqual(code, 4003)
+        run.assert_awaited_once()
+        self.assertEqual(run.call_args.args[0].__name__, "exists")
+
+    async def test_viewer_project_check_runs_on_executor(self):
+        token = signing.TimestampSigner().sign_object({"pid": self.project.id, "gid": self.group.id, "type": "view_link"})
+        await Project.objects.filter(id=self.project.id).aupdate(deleted_at="2020-01-01T00:00:00Z")
+        connected, code, run = await self._connect(f"share_token={token}")
+        self.assertFalse(connected)
+        self.assertEqual(code, 4003)
+        run.assert_awaited_once()
@@ -0,0 +1,45 @@
+import asyncio
+import contextvars
+import json
+import logging
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Read-only viewers (view_link tokens, e.g. a class watching the teacher's file). They aren't in the room's group, so
+# awareness, chat, roster and voice traffic never reaches them, and they aren't in the active set or the roster.
+# What they do get is the doc: every update an editor in this process sends is queued here, and once per
+# VIEWER_BATCH_INTERVAL the room's queue goes out as one frame to the room's viewers group.
+# So a busy room costs its viewers a handful of frames a second, however many editors are typing
+
+_pending = {}       # room -> update_b64s waiting for the next batch
+_flushes = set()    # the scheduled batch tasks, so they don't get garbage collected
+
+def group_name(room):
+    return f"{room}_viewers"
+
+def queue_update(channel_layer, room, update_b64):
+    pending = _pending.get(room)
+    if pending is not None:
+        pending.append(update_b64)
+        return
+    _pending[room] = [update_b64]
+    # Its own context, it'd otherwise log with the ids of whichever connection started the batch
+    task = asyncio.create_task(_flush(channel_layer, room), context=contextvars.Context())
+    _flushes.add(task)
+    task.add_done_callback(_flushes.discard)
+
+async def _flush(channel_layer, room):
+    await asyncio.sleep(settings.VIEWER_BATCH_INTERVAL)
+    updates = _pending.pop(room, [])
+    try:
+        await channel_layer.group_send(group_name(room), {
+            "type": "viewer.updates",
+            # Encoded once, every viewer sends it as is
+            "frame": json.dumps({"type": "updates", "updates_b64": updates}),
+        })
+        metrics.VIEWER_BATCH_UPDATES.observe(len(updates))
+    except Exception:
+        logger.exception("couldn't send viewer batch", extra={"event": "viewers.batch_error", "room": room, "updates": len(updates)})
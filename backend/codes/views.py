@@ -0,0 +1,15 @@
+import hmac
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, Http404
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
+from . import metrics  # registers the collectors
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, needs "Authorization: Bearer <METRICS_TOKEN>". Without a token it only exists with DEBUG on"""
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            raise Http404
+    elif not hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {settings.METRICS_TOKEN}".encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(metrics.scrape_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class ProjectsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'projects'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers the cache invalidation signals)
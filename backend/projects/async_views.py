@@ -0,0 +1,89 @@
+import json
+from django.core import signing
+from django.http import JsonResponse
+
+from backend.async_api import async_api_view
+from .models import Project
+from usergroups.models import Group
+from codes.models import Code
+from .serializers import ProjectDetailSerializer
+from .snippet_cache import aget_snippet_entry, snippet_response
+from usergroups.cache_helpers import aget_versions, user_groups_version_key, group_projects_version_key, build_etag, acached_json_response
+
+# Async versions of the hot read-only endpoints, used when ASYNC_API_VIEWS is on.
+# They return the same responses as the DRF views in views.py
+
+@async_api_view(["GET"])
+async def alist_projects(request, group_id):
+    """ Async version of list_projects """
+    user_version, group_version = await aget_versions(
+        user_groups_version_key(request.user.id), group_projects_version_key(group_id)
+    )
+    etag = build_etag("projects", group_id, request.user.id, user_version, group_version)
+
+    async def build():
+        try:
+            group = await Group.objects.aget(id=group_id)
+        except Group.DoesNotExist:
+            return JsonResponse({"error": "Invalid group_id"}, status=400)
+        if not await group.group_members.filter(id=request.user.id).aexists():
+            return JsonResponse({"error": "You are not in this group"}, status=403)
+
+        projects = Project.objects.filter(group=group).select_related("code")
+        return ProjectDetailSerializer([project async for project in projects], many=True).data
+
+    cache_key = f"listing:projects:g{group_id}:u{request.user.id}:v{user_version}.{group_version}"
+    return await acached_json_response(request, cache_key, etag, build)
+
+@async_api_view(["POST"], auth_required=False)
+async def avalidate_share_link(request):
+    """ Async version of validate_share_link """
+    try:
+        token = _request_data(request).get("token")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not token:
+        return JsonResponse({"error": "Token required"}, status=400)
+
+    signer = signing.TimestampSigner()
+    try:
+        data = signer.unsign_object(token)
+
+        if data.get('type') not in ('share_link', 'view_link'):
+            return JsonResponse({"error": "Invalid token type"}, status=400)
+
+        project = await Project.objects.aget(id=data['pid'])
+
+        return JsonResponse({
+            "project_id": project.id,
+            "project_name": project.project_name,
+            "group_id": data['gid'],
+            "read_only": data['type'] == 'view_link',
+            "valid": True
+        })
+    except (signing.BadSignature, signing.SignatureExpired, Project.DoesNotExist):
+        return JsonResponse({"error": "Invalid or expired link"}, status=400)
+
+@async_api_view(["GET"], auth_required=False)
+async def aget_snippet_content(request, token):
+    """ Async version of get_snippet_content """
+    signer = signing.TimestampSigner()
+    try:
+        data = signer.unsign_object(token)
+
+        if data.get('type') != 'snippet':
+            return JsonResponse({"error": "Invalid token type"}, status=400)
+
+        entry = await aget_snippet_entry(data['pid'])
+        return snippet_response(request, entry)
+    except (signing.BadSignature, signing.SignatureExpired, Code.DoesNotExist):
+        return JsonResponse({"error": "Snippet not found or expired"}, status=404)
+
+def _request_data(request):
+    """The request body as a dict, whether it was posted as JSON (like the frontend does) or as a form"""
+    if request.content_type != "application/json":
+        return request.POST
+    if not request.body:
+        return {}
+    body = json.loads(request.body)
+    return body if isinstance(body, dict) else {}
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import transaction
+
+from .models import Project
+from codes.models import Code, SEARCH_CONFIG
+from codes.redis_helpers import get_live_text, snapshot_ydoc_template, register_ydoc_clones
+from usergroups.cache_helpers import bump_versions_on_commit, group_projects_version_key
+
+def clone_project(source_id, project_names, progress=None):
+    """
+    Creates one copy of the source project per name, in the source's group.
+    Everything is inserted with bulk_create in one transaction, and the clones share a single snapshot of
+    the source's ydoc that each one copies the first time it's opened.
+    progress(done, total) gets called after every batch.
+    """
+    source = Project.objects.select_related("code").get(id=source_id)
+
+    # Clone what's in the editor right now if the source is live, otherwise what was saved
+    live = get_live_text(source_id)
+    if live is not None:
+        content = live["text"]
+    else:
+        content = source.code.content if hasattr(source, "code") else ""
+    template_key = snapshot_ydoc_template(source_id)
+
+    total = len(project_names)
+    created_ids = []
+    with transaction.atomic():
+        for start in range(0, total, settings.CLONE_BATCH_SIZE):
+            names = project_names[start:start + settings.CLONE_BATCH_SIZE]
+            projects = Project.objects.bulk_create([Project(project_name=name, group_id=source.group_id) for name in names])
+            Code.objects.bulk_create([Code(project=project, content=content) for project in projects])
+
+            batch_ids = [project.id for project in projects]
+            Code.objects.filter(project_id__in=batch_ids).update(search_vector=SearchVector("content", config=SEARCH_CONFIG))
+            created_ids += batch_ids
+
+            if progress:
+                progress(len(created_ids), total)
+
+        # bulk_create skips the save signals, so invalidate the listing ourselves
+        bump_versions_on_commit([group_projects_version_key(source.group_id)])
+        if template_key:
+            transaction.on_commit(lambda: register_ydoc_clones(template_key, created_ids))
+
+    return created_ids
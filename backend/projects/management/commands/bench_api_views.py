@@ -0,0 +1,112 @@
+import asyncio
+import statistics
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.management.base import BaseCommand
+from django.test import AsyncRequestFactory, override_settings
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import User
+from usergroups.models import Group
+from projects.models import Project
+from codes.models import Code
+from usergroups import views as group_views, async_views as group_async_views
+from projects import views as project_views, async_views as project_async_views
+
+class Command(BaseCommand):
+    help = "Benchmark the hot read-only endpoints, DRF (sync, thread pool) vs the async views, under concurrent load"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint and mode")
+        parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight at once")
+        parser.add_argument("--projects", type=int, default=50, help="Projects in the seeded group")
+        parser.add_argument("--keep-throttling", action="store_true", help="Don't disable the throttle rates while benchmarking")
+
+    def handle(self, *args, **options):
+        user, group, project = self._seed(options["projects"])
+        try:
+            if options["keep_throttling"]:
+                self._run_all(user, group, project, options)
+            else:
+                rest_framework = {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}}
+                original_rates = SimpleRateThrottle.THROTTLE_RATES
+                SimpleRateThrottle.THROTTLE_RATES = {"user": None, "anon": None}
+                try:
+                    with override_settings(REST_FRAMEWORK=rest_framework):
+                        self._run_all(user, group, project, options)
+                finally:
+                    SimpleRateThrottle.THROTTLE_RATES = original_rates
+        finally:
+            # The group delete cascades to the projects and codes
+            Group.all_objects.filter(id=group.id).delete()
+            user.delete()
+
+    def _seed(self, num_projects):
+        user = User.objects.create_user(email=f"bench_api_{time.time_ns()}@example.com")
+        group = Group.objects.create(owner=user, group_name="bench_api")
+        group.group_members.add(user)
+        projects = Project.objects.bulk_create([Project(project_name=f"bench {i}", group=group) for i in range(num_projects)])
+        Code.objects.bulk_create([Code(project=p, content=f"print({i})\n" * 20) for i, p in enumerate(projects)])
+        return user, group, projects[0]
+
+    def _run_all(self, user, group, project, options):
+        factory = AsyncRequestFactory()
+        auth = {"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"}
+        signer = signing.TimestampSigner()
+        share_token = signer.sign_object({"pid": project.id, "gid": group.id, "type": "share_link"})
+        snippet_token = signer.sign_object({"pid": project.id, "type": "snippet"})
+
+        endpoints = [
+            ("list_groups", group_views.list_groups, group_async_views.alist_groups,
+             lambda: factory.get("/groups/", headers=auth), {}),
+            ("list_projects", project_views.list_projects, project_async_views.alist_projects,
+             lambda: factory.get(f"/groups/{group.id}/projects/", headers=auth), {"group_id": group.id}),
+            ("validate_share_link", project_views.validate_share_link, project_async_views.avalidate_share_link,
+             lambda: factory.post("/api/validate-share-link/", {"token": share_token}, content_type="application/json"), {}),
+            ("get_snippet_content", project_views.get_snippet_content, project_async_views.aget_snippet_content,
+             lambda: factory.get(f"/api/public/snippet/{snippet_token}/"), {"token": snippet_token}),
+        ]
+
+        self.stdout.write(f"{'endpoint':<22}{'mode':<7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for name, sync_view, async_view, make_request, kwargs in endpoints:
+            # Sync views get run the way daphne runs them, through sync_to_async's thread
+            modes = [
+                ("sync", lambda request: sync_to_async(sync_view)(request, **kwargs)),
+                ("async", lambda request: async_view(request, **kwargs)),
+            ]
+            for mode, call in modes:
+                result = asyncio.run(self._load(call, make_request, options["requests"], options["concurrency"]))
+                self.stdout.write(
+                    f"{name:<22}{mode:<7}{result['rps']:>9.1f}{result['p50']:>9.2f}"
+                    f"{result['p95']:>9.2f}{result['p99']:>9.2f}{result['errors']:>8}"
+                )
+
+    async def _load(self, call, make_request, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await call(make_request())
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+
+        quantiles = statistics.quantiles(latencies, n=100)
+        return {
+            "rps": total / elapsed,
+            "p50": quantiles[49],
+            "p95": quantiles[94],
+            "p99": quantiles[98],
+            "errors": errors,
+        }
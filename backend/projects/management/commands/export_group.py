@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from usergroups.models import Group
+from projects.exports import iter_group_zip
+
+class Command(BaseCommand):
+    help = "Export every project in a group as a zip of .py files (for semester end)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("group_id", type=int)
+        parser.add_argument("-o", "--output", help="Where to write the zip (default: group_<id>_projects.zip)")
+
+    def handle(self, *args, **options):
+        group_id = options["group_id"]
+        if not Group.objects.filter(id=group_id).exists():
+            raise CommandError(f"Group {group_id} does not exist")
+
+        output = options["output"] or f"group_{group_id}_projects.zip"
+        written = 0
+        with open(output, "wb") as f:
+            for chunk in iter_group_zip(group_id):
+                f.write(chunk)
+                written += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {output}"))
@@ -1,10 +1,19 @@
 from django.db import models
 from usergroups.models import Group
 
+class ProjectManager(models.Manager):
+    """ Hides deleted projects, and projects in deleted groups (those are purged later, in batches) """
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True, group__deleted_at__isnull=True)
+
 class Project(models.Model):
     project_name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='projects')
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = ProjectManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.project_name
\ No newline at end of file
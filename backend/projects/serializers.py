@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from .models import Project
 
 class ProjectDetailSerializer(serializers.ModelSerializer):
@@ -19,4 +20,11 @@ class ProjectCreateSerializer(serializers.ModelSerializer):
         fields = ["project_name"]
 
 class ProjectUpdateSerializer(serializers.Serializer):
-    project_name = serializers.CharField(required=False)
\ No newline at end of file
+    project_name = serializers.CharField(required=False)
+
+class ProjectCloneSerializer(serializers.Serializer):
+    project_names = serializers.ListField(
+        child=serializers.CharField(max_length=100),
+        allow_empty=False,
+        max_length=settings.CLONE_MAX_TARGETS,
+    )
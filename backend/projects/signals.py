@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Project
+from .snippet_cache import invalidate_snippet
+from usergroups.cache_helpers import bump_versions_on_commit, group_projects_version_key
+
+# The project listing is cached per group, so any project change invalidates its group's listing.
+# The snippet shows the project name too, so a rename or delete drops its cached snippet
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_changed(sender, instance, **kwargs):
+    bump_versions_on_commit([group_projects_version_key(instance.group_id)])
+    invalidate_snippet(instance.pk)
@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
+
+from codes.models import Code
+from codes.redis_helpers import get_live_text, aget_live_text
+
+# brotli is optional, if it isn't installed we just serve gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Snippet links get posted in class chats, so the same snippet gets opened by a lot of people at once.
+# We cache the finished response (already compressed) per project, and only rebuild it when the code changes
+
+def snippet_cache_key(project_id):
+    return f"snippet:{project_id}"
+
+def invalidate_snippet(project_id):
+    transaction.on_commit(lambda: cache.delete(snippet_cache_key(project_id)))
+
+def invalidate_snippets(project_ids):
+    keys = [snippet_cache_key(pid) for pid in project_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+def _live_project_code(project_id):
+    # Joining the project saves a second query, and the filters replace the project manager we bypass
+    return Code.objects.select_related("project").filter(
+        project_id=project_id, project__deleted_at__isnull=True, project__group__deleted_at__isnull=True
+    )
+
+def build_snippet_entry(code_obj, live=None):
+    """
+    Prepares every encoding of the response body.
+    Uses the live text if the project is open in a room, otherwise the saved code.
+    """
+    if live is not None:
+        text, updated_at = live["text"], timezone.now()
+    else:
+        text, updated_at = code_obj.content, code_obj.updated_at
+
+    body = json.dumps({"code": text, "name": code_obj.project.project_name}).encode()
+    content_hash = hashlib.sha256(body).hexdigest()
+
+    bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=6)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(body)
+
+    return {
+        "hash": content_hash,
+        "text_sha1": live["sha1"] if live is not None else None,
+        "etag": quote_etag(f"snippet-{code_obj.project_id}-{content_hash[:16]}"),
+        "last_modified": updated_at.timestamp(),
+        "bodies": bodies,
+    }
+
+def _is_stale(entry, live):
+    # If the project is live, the cached entry is only good if it was built from the same text
+    return entry is None or (live is not None and entry["text_sha1"] != live["sha1"])
+
+def get_snippet_entry(project_id):
+    """Returns the cached snippet for a project (building it on a miss), raises Code.DoesNotExist if there's no code"""
+    key = snippet_cache_key(project_id)
+    live = get_live_text(project_id)
+    entry = cache.get(key)
+
+    if _is_stale(entry, live):
+        entry = build_snippet_entry(_live_project_code(project_id).get(), live)
+        cache.set(key, entry, settings.SNIPPET_CACHE_TTL)
+    return entry
+
+async def aget_snippet_entry(project_id):
+    """Async version of get_snippet_entry"""
+    key = snippet_cache_key(project_id)
+    live = await aget_live_text(project_id)
+    entry = await cache.aget(key)
+
+    if _is_stale(entry, live):
+        entry = build_snippet_entry(await _live_project_code(project_id).aget(), live)
+        await cache.aset(key, entry, settings.SNIPPET_CACHE_TTL)
+    return entry
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+def snippet_response(request, entry):
+    """Serves a cached snippet, answering conditional GETs with a 304"""
+    accepted = _accepted_encodings(request)
+    encoding = "identity"
+    for candidate in ("br", "gzip"):
+        if candidate in accepted and candidate in entry["bodies"]:
+            encoding = candidate
+            break
+
+    response = HttpResponse(entry["bodies"][encoding], content_type="application/json")
+    if encoding != "identity":
+        response["Content-Encoding"] = encoding
+    response["ETag"] = entry["etag"]
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    response["Cache-Control"] = f"public, max-age={settings.SNIPPET_CACHE_MAX_AGE}, must-revalidate"
+    patch_vary_headers(response, ("Accept-Encoding",))
+
+    return get_conditional_response(
+        request, etag=entry["etag"], last_modified=int(entry["last_modified"]), response=response
+    )
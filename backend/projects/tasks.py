@@ -0,0 +1,76 @@
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Project
+from .cloning import clone_project
+from usergroups.models import Group
+from codes.models import Code
+from codes.redis_helpers import SYNC_REDIS, clear_project_keys
+from usergroups.cache_helpers import bump_versions_on_commit, group_projects_version_key, user_groups_version_key
+from .snippet_cache import invalidate_snippets
+
+@shared_task(bind=True)
+def clone_project_task(self, source_id, group_id, project_names):
+    """Clones a project for a large group in the background, reporting progress through the result backend"""
+    def progress(done, total):
+        self.update_state(state="PROGRESS", meta={"group_id": group_id, "done": done, "total": total})
+
+    created_ids = clone_project(source_id, project_names, progress=progress)
+    return {"group_id": group_id, "done": len(created_ids), "total": len(project_names), "project_ids": created_ids}
+
+@shared_task
+def purge_deleted():
+    """
+    Deletes projects and groups that were marked as deleted, in bounded batches so no single
+    transaction (or request) has to cascade through a whole group, and clears their redis keys.
+    """
+    lock = SYNC_REDIS.lock("lock:purge_deleted", timeout=settings.PURGE_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+
+    purged = 0
+    try:
+        # Projects that were deleted themselves, or whose group was
+        doomed = Project.all_objects.filter(Q(deleted_at__isnull=False) | Q(group__deleted_at__isnull=False))
+        while True:
+            rows = list(doomed.values_list("id", "group_id")[:settings.PURGE_BATCH_SIZE])
+            if not rows:
+                break
+            ids = [pid for pid, _ in rows]
+            with transaction.atomic():
+                # Once per batch instead of the post_delete handlers once per row (each of them fetching the project again)
+                bump_versions_on_commit(group_projects_version_key(gid) for gid in {gid for _, gid in rows})
+                invalidate_snippets(ids)
+                _raw_delete(Code.objects.filter(project_id__in=ids))
+                _raw_delete(Project.all_objects.filter(id__in=ids))
+            clear_project_keys(ids)
+            purged += len(ids)
+
+        # Their projects are gone now, so the groups themselves are cheap to delete.
+        # Skips any that got a project in the meantime, the next run takes care of those
+        doomed_groups = Group.all_objects.filter(deleted_at__isnull=False, projects__isnull=True)
+        while True:
+            ids = list(doomed_groups.values_list("id", flat=True)[:settings.PURGE_BATCH_SIZE])
+            if not ids:
+                break
+            Membership = Group.group_members.through
+            with transaction.atomic():
+                member_ids = Membership.objects.filter(group_id__in=ids).values_list("user_id", flat=True).distinct()
+                bump_versions_on_commit(
+                    [user_groups_version_key(uid) for uid in member_ids] + [group_projects_version_key(gid) for gid in ids]
+                )
+                _raw_delete(Membership.objects.filter(group_id__in=ids))
+                _raw_delete(Group.all_objects.filter(id__in=ids))
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            pass
+
+    return purged
+
+def _raw_delete(queryset):
+    # A plain DELETE: no signal handlers and no cascade collection, purge_deleted invalidates the whole batch itself
+    return queryset._raw_delete(queryset.db)
@@ -1,3 +1,72 @@
-from django.test import TestCase
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core import signing
+from django.db import connection
+
+from backend.query_budgets import QueryBudgetTestCase
+
+# (max queries, max wall time in ms), see backend/query_budgets.py
+BUDGETS = {
+    "validate_share_link": (1, 100),
+    "snippet_cold": (1, 200),
+    "snippet_warm": (0, 100),
+    "list_projects_cold": (4, 1500),
+    "list_projects_warm": (1, 100),
+    "create_project": (5, 200),
+    "search_projects": (4, 1000),
+    "export_projects": (4, 3000),
+    "edit_project": (6, 200),
+    "share_link": (3, 100),
+    "snippet_link": (3, 100),
+    "view_link": (4, 100),                 # plus the project EXISTS, links only get signed for real projects
+    "clone_project": (9, 500),
+    "delete_project": (5, 200),
+}
+
+class ProjectEndpointBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.projects = f"/groups/{self.group.id}/projects"
+
+    def test_validate_share_link(self):
+        token = signing.TimestampSigner().sign_object({"pid": self.project.id, "gid": self.group.id, "type": "share_link"})
+        self.assertWithinBudget(BUDGETS["validate_share_link"], "post", "/api/validate-share-link/", {"token": token})
+
+    def test_snippet(self):
+        token = signing.TimestampSigner().sign_object({"pid": self.project.id, "type": "snippet"})
+        self.assertWithinBudget(BUDGETS["snippet_cold"], "get", f"/api/public/snippet/{token}/")
+        self.assertWithinBudget(BUDGETS["snippet_warm"], "get", f"/api/public/snippet/{token}/")
+
+    def test_list_projects(self):
+        self.assertWithinBudget(BUDGETS["list_projects_cold"], "get", f"{self.projects}/", **self.auth())
+        self.assertWithinBudget(BUDGETS["list_projects_warm"], "get", f"{self.projects}/", **self.auth())
+
+    def test_create_project(self):
+        self.assertWithinBudget(BUDGETS["create_project"], "post", f"{self.projects}/create/", {"project_name": "budget new project"},
+                                **self.auth())
+
+    # Full-text and trigram search
+    @skipUnless(connection.vendor == "postgresql", "search needs postgres")
+    def test_search_projects(self):
+        self.assertWithinBudget(BUDGETS["search_projects"], "get", f"{self.projects}/search/?q=input", **self.auth())
+
+    def test_export_projects(self):
+        self.assertWithinBudget(BUDGETS["export_projects"], "get", f"{self.projects}/export/", **self.auth())
+
+    def test_edit_project(self):
+        self.assertWithinBudget(BUDGETS["edit_project"], "put", f"{self.projects}/{self.project.id}/edit/",
+                                {"project_name": "budget renamed"}, **self.auth())
+
+    def test_share_links(self):
+        for name, path in (("share_link", "share"), ("snippet_link", "share-snippet"), ("view_link", "share-view")):
+            with self.subTest(name):
+                self.assertWithinBudget(BUDGETS[name], "get", f"{self.projects}/{self.project.id}/{path}/", **self.auth())
+
+    # Clones fill in their search_vector
+    @skipUnless(connection.vendor == "postgresql", "cloning needs postgres")
+    def test_clone_project(self):
+        self.assertWithinBudget(BUDGETS["clone_project"], "post", f"{self.projects}/{self.project.id}/clone/",
+                                {"project_names": ["budget clone"]}, **self.auth())
+
+    def test_delete_project(self):
+        self.assertWithinBudget(BUDGETS["delete_project"], "delete", f"{self.projects}/{self.project.id}/delete/", **self.auth())
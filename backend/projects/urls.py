@@ -1,19 +1,27 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     # Listing and creating projects
     # (Matches: /groups/1/projects/ and /groups/1/projects/create/)
-    path("", views.list_projects, name="list_projects"),
+    path("", async_views.alist_projects if settings.ASYNC_API_VIEWS else views.list_projects, name="list_projects"),
     path("create/", views.create_project, name="create_project"),
+    path("search/", views.search_projects, name="search_projects"),
+    path("export/", views.export_projects, name="export_projects"),
     
     # Operations on a specific project
     path("<int:project_id>/edit/", views.edit_project, name="edit_project"),
     path("<int:project_id>/delete/", views.delete_project, name="delete_project"),
 
+    # Cloning a project for the whole group
+    path("<int:project_id>/clone/", views.clone_project_view, name="clone_project"),
+    path("clone-status/<str:task_id>/", views.clone_status, name="clone_status"),
+
     # SHARE GENERATION (Relative paths)
     # These generate the links. You must be in the group to click these.
     # (Matches: /groups/1/projects/5/share/)
     path('<int:project_id>/share/', views.generate_share_link, name="generate_share_link"),
     path('<int:project_id>/share-snippet/', views.generate_snippet_link, name="generate_snippet_link"),
+    path('<int:project_id>/share-view/', views.generate_view_link, name="generate_view_link"),
 ]
\ No newline at end of file
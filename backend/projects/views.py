@@ -4,12 +4,27 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.core import signing
 from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.db import transaction
+from django.utils import timezone
+from celery.result import AsyncResult
+import html
+import re
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest, Lower, StrIndex, Substr
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchHeadline
 from decouple import config
+from backend.db_routers import read_replica
 
 from .models import Project
 from usergroups.models import Group
-from codes.models import Code
-from .serializers import ProjectDetailSerializer, ProjectCreateSerializer, ProjectUpdateSerializer
+from codes.models import Code, SEARCH_CONFIG
+from .serializers import ProjectDetailSerializer, ProjectCreateSerializer, ProjectUpdateSerializer, ProjectCloneSerializer
+from .cloning import clone_project
+from .tasks import clone_project_task, purge_deleted
+from .snippet_cache import get_snippet_entry, snippet_response
+from .exports import iter_group_zip, aiter_sync
+from usergroups.cache_helpers import get_versions, user_groups_version_key, group_projects_version_key, build_etag, cached_json_response
 
 # Helper functions
 def get_group_or_error(group_id):
@@ -24,7 +39,22 @@ def get_project_or_error(project_id):
     except Project.DoesNotExist:
         return None
 
+# ts_headline marks matches with these instead of <mark>, so the code around them can be escaped before the tags go in
+_HL_START, _HL_STOP = "\ue000", "\ue001"
+SEARCH_CONTEXT_CHARS = 80      # code shown on each side of a substring match
+
+def headline_html(headline):
+    """Escapes a ts_headline and swaps its markers for <mark> tags"""
+    return html.escape(headline).replace(_HL_START, "<mark>").replace(_HL_STOP, "</mark>")
+
+def highlight_substring(text, q):
+    """Escapes text and puts <mark> tags around every (case insensitive) occurrence of q"""
+    parts = re.split(f"({re.escape(q)})", text, flags=re.IGNORECASE)
+    # split keeps the matches at the odd indexes
+    return "".join(f"<mark>{html.escape(part)}</mark>" if i % 2 else html.escape(part) for i, part in enumerate(parts))
+
 def check_membership_or_error(user, group):
+    # Always the primary, a lagging replica would still let in someone who was just removed
     return group.group_members.filter(id=user.id).exists()
 
 # Standard CRUD Routes
@@ -32,15 +62,91 @@ def check_membership_or_error(user, group):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def list_projects(request, group_id):
+    # The cache key includes the user's version too, which gets bumped when their membership changes,
+    # so a cached listing (or ETag) also proves they were still a member
+    user_version, group_version = get_versions(
+        user_groups_version_key(request.user.id), group_projects_version_key(group_id)
+    )
+    etag = build_etag("projects", group_id, request.user.id, user_version, group_version)
+
+    def build():
+        group = get_group_or_error(group_id)
+        if not group:
+            return Response({"error": "Invalid group_id"}, status=400)
+        if not check_membership_or_error(request.user, group):
+            return Response({"error": "You are not in this group"}, status=403)
+
+        projects = Project.objects.filter(group=group).select_related("code")
+        return ProjectDetailSerializer(projects, many=True).data
+
+    cache_key = f"listing:projects:g{group_id}:u{request.user.id}:v{user_version}.{group_version}"
+    return cached_json_response(request, cache_key, etag, build)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def search_projects(request, group_id):
+    """
+    Searches the code of every project in a group (/groups/1/projects/search/?q=input).
+    Whole words go through the full-text index, substrings like "input(" through the trigram index.
+    The snippet is escaped HTML, the matches wrapped in <mark>.
+    """
+    group = get_group_or_error(group_id)
+    if not group:
+        return Response({"error": "Invalid group_id"}, status=400)
+    if not check_membership_or_error(request.user, group):
+        return Response({"error": "You are not in this group"}, status=403)
+
+    q = request.query_params.get("q", "").strip()
+    if len(q) < settings.SEARCH_MIN_QUERY_LENGTH:
+        return Response({"error": f"Query must be at least {settings.SEARCH_MIN_QUERY_LENGTH} characters"}, status=400)
+
+    query = SearchQuery(q, config=SEARCH_CONFIG, search_type="plain")
+    results = (
+        Code.objects.filter(project__group=group, project__deleted_at__isnull=True)
+        .filter(Q(search_vector=query) | Q(content__icontains=q))
+        .annotate(
+            rank=SearchRank(F("search_vector"), query),
+            snippet=SearchHeadline(
+                "content", query, config=SEARCH_CONFIG,
+                start_sel=_HL_START, stop_sel=_HL_STOP, max_fragments=3, fragment_delimiter=" ... ",
+            ),
+            # For rows only the substring matched, ts_headline has nothing to mark, so we also pull the code around it
+            match_at=StrIndex(Lower("content"), Lower(Value(q))),
+            around=Substr("content", Greatest(F("match_at") - SEARCH_CONTEXT_CHARS, 1), len(q) + 2 * SEARCH_CONTEXT_CHARS),
+        )
+        .order_by("-rank", "-updated_at")
+        # Only pull what we send back, not the whole code of every match
+        .values("project_id", "project__project_name", "updated_at", "rank", "snippet", "match_at", "around")[:settings.SEARCH_RESULT_LIMIT]
+    )
+
+    # Search is the heaviest read we have and a few ms of replica lag doesn't matter for it
+    with read_replica():
+        results = list(results)
+
+    return Response([
+        {
+            "project_id": r["project_id"],
+            "project_name": r["project__project_name"],
+            "updated_at": r["updated_at"],
+            "rank": r["rank"],
+            "snippet": headline_html(r["snippet"]) if _HL_START in r["snippet"] or not r["match_at"] else highlight_substring(r["around"], q),
+        }
+        for r in results
+    ], status=200)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_projects(request, group_id):
+    """ Streams every project in the group as a zip of .py files """
     group = get_group_or_error(group_id)
     if not group:
         return Response({"error": "Invalid group_id"}, status=400)
     if not check_membership_or_error(request.user, group):
         return Response({"error": "You are not in this group"}, status=403)
 
-    projects = Project.objects.filter(group=group)
-    serializer = ProjectDetailSerializer(projects, many=True)
-    return Response(serializer.data, status=200)
+    response = StreamingHttpResponse(aiter_sync(iter_group_zip(group.id)), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="group_{group.id}_projects.zip"'
+    return response
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -83,6 +189,56 @@ def edit_project(request, group_id, project_id):
 
     return Response(serializer.errors, status=400)
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def clone_project_view(request, group_id, project_id):
+    """
+    Copies a project once per name in project_names (e.g. one per student for an exercise).
+    Small batches are cloned right away, large ones run in celery and can be followed with clone-status.
+    """
+    group = get_group_or_error(group_id)
+    project = get_project_or_error(project_id)
+
+    if not group or not project or project.group_id != group.id:
+        return Response({"error": "Not found"}, status=404)
+    if not check_membership_or_error(request.user, group):
+        return Response({"error": "Not authorized"}, status=403)
+
+    serializer = ProjectCloneSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+
+    project_names = serializer.validated_data["project_names"]
+    if len(project_names) > settings.CLONE_ASYNC_THRESHOLD:
+        task = clone_project_task.delay(project.id, group.id, project_names)
+        return Response({"task_id": task.id, "total": len(project_names)}, status=202)
+
+    created_ids = clone_project(project.id, project_names)
+    projects = Project.objects.filter(id__in=created_ids).select_related("code")
+    return Response(ProjectDetailSerializer(projects, many=True).data, status=201)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def clone_status(request, group_id, task_id):
+    """ Progress of a background clone """
+    group = get_group_or_error(group_id)
+    if not group: return Response({"error": "Group not found"}, status=404)
+    if not check_membership_or_error(request.user, group):
+        return Response({"error": "Not authorized"}, status=403)
+
+    result = AsyncResult(task_id)
+    info = result.info if isinstance(result.info, dict) else {}
+    # Unknown task ids just show up as PENDING, but don't show another group's clone
+    if info and info.get("group_id") != group.id:
+        return Response({"error": "Not found"}, status=404)
+
+    return Response({
+        "state": result.state,
+        "done": info.get("done", 0),
+        "total": info.get("total"),
+        "project_ids": info.get("project_ids"),
+    })
+
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
 def delete_project(request, group_id, project_id):
@@ -93,10 +249,11 @@ def delete_project(request, group_id, project_id):
     if not check_membership_or_error(request.user, group):
         return Response({"error": "Not authorized"}, status=403)
 
-    if hasattr(project, 'code'):
-        project.code.delete()
-        
-    project.delete()
+    # Hide it right away, the actual delete (and redis cleanup) happens in the background
+    project.deleted_at = timezone.now()
+    project.save(update_fields=["deleted_at"])
+    transaction.on_commit(purge_deleted.delay)
+
     return Response({"message": "Project deleted"}, status=200)
 
 
@@ -127,6 +284,36 @@ def generate_share_link(request, group_id, project_id):
         "share_url": f"{base_url}/join-shared/{token}" 
     })
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def generate_view_link(request, group_id, project_id):
+    """
+    Generates a READ-ONLY link to the live session (Broadcast Mode, e.g. a class watching the teacher).
+    Viewers see every change as it happens but can't edit, and don't show up in the session.
+    """
+    group = get_group_or_error(group_id)
+    if not group: return Response({"error": "Group not found"}, status=404)
+
+    if not check_membership_or_error(request.user, group):
+        return Response({"error": "Not authorized"}, status=403)
+
+    # Only sign links for projects that are actually in this group
+    if not Project.objects.filter(id=project_id, group_id=group_id).exists():
+        return Response({"error": "Project not found"}, status=404)
+
+    signer = signing.TimestampSigner()
+    view_payload = {
+        "pid": project_id,
+        "gid": group_id,
+        "type": "view_link"
+    }
+    token = signer.sign_object(view_payload)
+
+    base_url = config('NAKED_ORIGIN', default='http://localhost:5173')
+    return Response({
+        "view_url": f"{base_url}/view/{token}"
+    })
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def validate_share_link(request):
@@ -143,7 +330,7 @@ def validate_share_link(request):
     try:
         data = signer.unsign_object(token)
         
-        if data.get('type') != 'share_link':
+        if data.get('type') not in ('share_link', 'view_link'):
             return Response({"error": "Invalid token type"}, status=400)
 
         project = Project.objects.get(id=data['pid'])
@@ -152,6 +339,7 @@ def validate_share_link(request):
             "project_id": project.id,
             "project_name": project.project_name,
             "group_id": data['gid'],
+            "read_only": data['type'] == 'view_link',
             "valid": True
         })
     except (signing.BadSignature, signing.SignatureExpired, Project.DoesNotExist):
@@ -187,6 +375,7 @@ def generate_snippet_link(request, group_id, project_id):
 def get_snippet_content(request, token):
     """
     Fetches the code content for the Offline Playground.
+    Served from a precompressed cache, with an ETag so browsers/nginx can revalidate cheaply.
     """
     signer = signing.TimestampSigner()
     try:
@@ -195,14 +384,7 @@ def get_snippet_content(request, token):
         if data.get('type') != 'snippet':
             return Response({"error": "Invalid token type"}, status=400)
 
-        project = Project.objects.get(id=data['pid'])
-        
-        code_obj = Code.objects.get(project=project)
-        content = code_obj.content if hasattr(code_obj, 'content') else ""
-
-        return Response({
-            "code": content,
-            "name": project.project_name
-        })
-    except (signing.BadSignature, signing.SignatureExpired, Project.DoesNotExist, Code.DoesNotExist):
-        return Response({"error": "Snippet not found or expired"}, status=404)
\ No newline at end of file
+        entry = get_snippet_entry(data['pid'])
+        return snippet_response(request, entry)
+    except (signing.BadSignature, signing.SignatureExpired, Code.DoesNotExist):
+        return Response({"error": "Snippet not found or expired"}, status=404)
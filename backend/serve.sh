@@ -0,0 +1,19 @@
+#!/bin/sh
+# Runs the ASGI app (http + websockets) as WEB_CONCURRENCY uvicorn worker processes on one port, one per core by default.
+# The supervisor binds the socket once and every worker accepts on it, each with its own uvloop event loop.
+# Every worker is its own node as far as the rest of the app is concerned (NODE_ID, DB pool, DB executor), and its
+# metrics go to PROMETHEUS_MULTIPROC_DIR so /metrics adds them up (see codes/metrics.py). On SIGTERM the workers
+# close their sockets, let the disconnects persist, then hand back their rooms (see codes/lifespan.py)
+set -e
+
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}"
+# Files from the last run would get added to this one's numbers
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+exec uvicorn backend.asgi:application \
+    --host 0.0.0.0 --port "${PORT:-8000}" \
+    --workers "${WEB_CONCURRENCY:-$(nproc)}" \
+    --loop uvloop --http httptools --ws websockets \
+    --lifespan on \
+    --timeout-graceful-shutdown "${GRACEFUL_SHUTDOWN_TIMEOUT:-20}"
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UsergroupsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'usergroups'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers the cache invalidation signals)
@@ -0,0 +1,29 @@
+from datetime import timedelta
+from django.utils import timezone
+from backend.async_api import async_api_view
+from .models import Group
+from .serializers import GroupDetailSerializer
+from .cache_helpers import aget_versions, user_groups_version_key, build_etag, acached_json_response
+
+# Async versions of the hot read-only endpoints, used when ASYNC_API_VIEWS is on
+
+@async_api_view(["GET"])
+async def alist_groups(request):
+    """ Async version of list_groups """
+
+    user = request.user
+
+    now = timezone.now()
+    if user.last_login is None or (now - user.last_login) > timedelta(days=1):
+        user.last_login = now
+        await user.asave(update_fields=['last_login'])
+
+    (version,) = await aget_versions(user_groups_version_key(user.id))
+    etag = build_etag("groups", user.id, version)
+
+    async def build():
+        # Nothing can be lazy loaded in async code, so fetch the owner and members up front
+        groups = Group.objects.filter(group_members=user).select_related("owner").prefetch_related("group_members")
+        return GroupDetailSerializer([group async for group in groups], many=True).data
+
+    return await acached_json_response(request, f"listing:groups:u{user.id}:v{version}", etag, build)
@@ -0,0 +1,103 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.renderers import JSONRenderer
+
+# Listing responses are cached under versioned keys. Instead of hunting down every cached body when something
+# changes, the signals just bump a version number, and the old entries stop being looked up (and expire on their own)
+
+def user_groups_version_key(user_id):
+    return f"listing_version:user:{user_id}"        # bumped when any group the user is in (or their membership) changes
+
+def group_projects_version_key(group_id):
+    return f"listing_version:group:{group_id}"      # bumped when a project or code in the group changes
+
+def get_versions(*keys):
+    """Fetches the current version for each key in one round trip, initializing the missing ones"""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from a timestamp instead of 1, so a version that got evicted can never come back
+            # with a number a browser still has an ETag for
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+async def aget_versions(*keys):
+    """Async version of get_versions"""
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+def bump_versions(keys):
+    """Invalidates every listing cached under these version keys"""
+    for key in set(keys):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Nothing cached under this key yet, nothing to invalidate
+            pass
+
+def bump_versions_on_commit(keys):
+    """Bump once the transaction commits, otherwise a concurrent request could cache the old rows under the new version"""
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: bump_versions(keys))
+
+def build_etag(*parts):
+    return quote_etag("-".join(str(p) for p in parts))
+
+def cached_json_response(request, cache_key, etag, build_data):
+    """
+    Serves a JSON listing from the cache.
+    Returns a 304 if the client already has this version, otherwise the cached body (built with build_data() on a miss).
+    build_data can return a Response instead of data, for errors that shouldn't be cached.
+    """
+    if _client_has(request, etag):
+        return _not_modified(etag)
+
+    body = cache.get(cache_key)
+    if body is None:
+        data = build_data()
+        if isinstance(data, HttpResponse):
+            return data
+        body = JSONRenderer().render(data)
+        cache.set(cache_key, body, settings.LISTING_CACHE_TTL)
+
+    return _listing_response(body, etag)
+
+async def acached_json_response(request, cache_key, etag, build_data):
+    """Async version of cached_json_response, build_data is a coroutine function"""
+    if _client_has(request, etag):
+        return _not_modified(etag)
+
+    body = await cache.aget(cache_key)
+    if body is None:
+        data = await build_data()
+        if isinstance(data, HttpResponse):
+            return data
+        body = JSONRenderer().render(data)
+        await cache.aset(cache_key, body, settings.LISTING_CACHE_TTL)
+
+    return _listing_response(body, etag)
+
+def _client_has(request, etag):
+    if_none_match = request.headers.get("If-None-Match")
+    return bool(if_none_match) and (etag in parse_etags(if_none_match) or if_none_match.strip() == "*")
+
+def _not_modified(etag):
+    response = HttpResponseNotModified()
+    response["ETag"] = etag
+    return response
+
+def _listing_response(body, etag):
+    response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"     # let the browser keep it, but always revalidate with the ETag
+    return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usergroups', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -8,6 +8,11 @@ def generate_access_code(length=12):
     chars = string.ascii_letters + string.digits
     return ''.join(secrets.choice(chars) for _ in range(length))
 
+class NotDeletedManager(models.Manager):
+    """ Default manager that hides rows marked as deleted, they get purged in the background (see projects/tasks.py) """
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 class Group(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     group_name = models.CharField(max_length=100)
@@ -15,6 +20,10 @@ class Group(models.Model):
 
     # Each group will have an auto-generated code to join
     access_code = models.CharField(max_length=20, unique=True, default=generate_access_code)
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = NotDeletedManager()
+    all_objects = models.Manager()      # includes deleted groups, only the purge task should need this
 
     def __str__(self):
         return self.group_name
\ No newline at end of file
@@ -38,10 +38,15 @@ class GroupJoinSerializer(serializers.Serializer):
 
         # Access the current user via the serializer context
         user = self.context['request'].user
-        if user in group.group_members.all():
+        if group.group_members.filter(id=user.id).exists():
             raise serializers.ValidationError("You are already a member of this group.")
-        
+
+        self._group = group
         return value
+
+    def get_group(self):
+        """Helper to fetch group after validation"""
+        return self._group
     
 class GroupUpdateSerializer(serializers.Serializer):
     id = serializers.IntegerField()
@@ -55,11 +60,13 @@ class GroupUpdateSerializer(serializers.Serializer):
         except Group.DoesNotExist:
             raise serializers.ValidationError("Invalid group ID.")
         
-        if user not in group.group_members.all():
+        if not group.group_members.filter(id=user.id).exists():
             raise serializers.ValidationError("You are not a member of this group.")
 
+        self._group = group
         return value
 
     def get_group(self):
         """Helper to fetch group after validation"""
-        return Group.objects.get(id=self.validated_data["id"])
\ No newline at end of file
+        # validate_id already loaded it
+        return self._group
\ No newline at end of file
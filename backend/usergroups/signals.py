@@ -0,0 +1,45 @@
+from django.db.models.signals import post_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Group
+from projects.models import Project
+from projects.snippet_cache import invalidate_snippets
+from .cache_helpers import bump_versions_on_commit, user_groups_version_key, group_projects_version_key
+
+# Every member's group listing shows the group (name, members, owner), so a change to a group invalidates all of them
+
+def _member_keys(group):
+    return [user_groups_version_key(uid) for uid in group.group_members.values_list("id", flat=True)]
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, update_fields=None, **kwargs):
+    # A new group has no members yet, adding them bumps their listings
+    if created:
+        return
+    bump_versions_on_commit(_member_keys(instance))
+    if instance.deleted_at is not None and update_fields and "deleted_at" in update_fields:
+        # Its projects' public snippets would be served from the cache until the purge gets to them
+        invalidate_snippets(Project.all_objects.filter(group_id=instance.pk).values_list("id", flat=True))
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # Members have to be collected before the delete cascades through the membership table
+    bump_versions_on_commit(_member_keys(instance) + [group_projects_version_key(instance.pk)])
+
+@receiver(m2m_changed, sender=Group.group_members.through)
+def group_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if reverse:
+        # user.custom_groups.add(...): instance is the user, pk_set holds group ids
+        groups = Group.objects.filter(pk__in=pk_set) if pk_set else instance.custom_groups.all()
+        keys = [user_groups_version_key(instance.pk)]
+        for group in groups:
+            keys += _member_keys(group)
+    else:
+        # group.group_members.add(...): instance is the group, pk_set holds user ids
+        # The joining/leaving users are in pk_set, everyone else is still in the group
+        keys = _member_keys(instance) + [user_groups_version_key(uid) for uid in (pk_set or [])]
+
+    bump_versions_on_commit(keys)
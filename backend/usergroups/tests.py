@@ -1,3 +1,32 @@
-from django.test import TestCase
+from backend.query_budgets import QueryBudgetTestCase
 
-# Create your tests here.
+# (max queries, max wall time in ms), see backend/query_budgets.py
+BUDGETS = {
+    "list_groups_cold": (4, 3000),      # user, groups + owners, members, and last_login once a day
+    "list_groups_warm": (2, 100),
+    "create_group": (6, 200),
+    "join_group": (8, 500),
+    "edit_group": (5, 300),
+    "leave_group": (6, 300),
+}
+
+class GroupEndpointBudgetTests(QueryBudgetTestCase):
+    def test_list_groups(self):
+        self.assertWithinBudget(BUDGETS["list_groups_cold"], "get", "/groups/", **self.auth())
+        self.assertWithinBudget(BUDGETS["list_groups_warm"], "get", "/groups/", **self.auth())
+
+    def test_create_group(self):
+        self.assertWithinBudget(BUDGETS["create_group"], "post", "/groups/create/", {"group_name": "budget new group"}, **self.auth())
+
+    def test_join_group(self):
+        self.assertWithinBudget(BUDGETS["join_group"], "put", "/groups/join/", {"access_code": self.group.access_code},
+                                **self.auth(self.outsider))
+
+    def test_edit_group(self):
+        self.assertWithinBudget(BUDGETS["edit_group"], "put", "/groups/edit/", {"id": self.group.id, "group_name": "budget renamed"},
+                                **self.auth())
+
+    def test_leave_group(self):
+        self.group.group_members.add(self.outsider)
+        self.assertWithinBudget(BUDGETS["leave_group"], "delete", "/groups/leave/",
+                                {"id": self.group.id, "group_name": self.group.group_name}, **self.auth(self.outsider))
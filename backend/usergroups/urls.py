@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.urls import path, include
 from .views import create_group, join_group, leave_group, list_groups, edit_group
+from .async_views import alist_groups
 
 urlpatterns = [
-    path("", list_groups, name="list_groups"),
+    path("", alist_groups if settings.ASYNC_API_VIEWS else list_groups, name="list_groups"),
     path("create/", create_group, name="create_group"),
     path("join/", join_group, name="join_group"),
     path("leave/", leave_group, name="leave_group"),
@@ -4,8 +4,14 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import Group
 from .serializers import GroupCreateSerializer, GroupDetailSerializer, GroupJoinSerializer, GroupUpdateSerializer
+from .cache_helpers import get_versions, user_groups_version_key, build_etag, cached_json_response
 from datetime import timedelta
+from django.db import transaction
 from django.utils import timezone
+from projects.tasks import purge_deleted
+import logging
+
+logger = logging.getLogger(__name__)
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -23,7 +29,6 @@ def create_group(request):
         )
         # Add owner as first member
         group.group_members.add(request.user)
-        group.save()
 
         # Serialize and send back
         return Response(GroupDetailSerializer(group).data, status=status.HTTP_201_CREATED)
@@ -37,7 +42,7 @@ def join_group(request):
     serializer = GroupJoinSerializer(data=request.data, context={'request': request})
 
     if serializer.is_valid():
-        group = Group.objects.get(access_code=serializer.validated_data["access_code"])
+        group = serializer.get_group()
         group.group_members.add(request.user)
 
         return Response(GroupDetailSerializer(group).data)
@@ -56,10 +61,15 @@ def list_groups(request):
         user.last_login = now
         user.save(update_fields=['last_login'])
 
-    groups = Group.objects.filter(group_members=user)
+    # The dashboard polls this, so serve it from the cache until one of the user's groups changes
+    (version,) = get_versions(user_groups_version_key(user.id))
+    etag = build_etag("groups", user.id, version)
+
+    def build():
+        groups = Group.objects.filter(group_members=user).select_related("owner").prefetch_related("group_members")
+        return GroupDetailSerializer(groups, many=True).data
 
-    serializer = GroupDetailSerializer(groups, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return cached_json_response(request, f"listing:groups:u{user.id}:v{version}", etag, build)
 
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
@@ -73,8 +83,11 @@ def leave_group(request):
         group.group_members.remove(request.user)
 
         if group.group_members.count() == 0:
-            group.delete()
-            print("deleted the group")
+            # Hide it right away, its projects and the group itself get purged in the background
+            group.deleted_at = timezone.now()
+            group.save(update_fields=["deleted_at"])
+            transaction.on_commit(purge_deleted.delay)
+            logger.info("last member left, deleting group", extra={"event": "group_deleted", "group_id": group.id})
 
         return Response({"message": f"Left group {group.group_name}"})
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -1,6 +1,15 @@
+import logging
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # Otherwise the first sign of it is every Google login failing
+        if not settings.DEBUG and not settings.GOOGLE_CLIENT_ID:
+            logger.warning("GOOGLE_CLIENT_ID isn't set, Google login is disabled", extra={"event": "google_login_disabled"})
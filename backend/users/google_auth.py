@@ -0,0 +1,77 @@
+import json
+import jwt
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+# Google ID tokens are JWTs signed with keys Google publishes as a JWKS. Instead of asking Google's tokeninfo
+# endpoint on every login, we keep their keys in the cache and check the signature ourselves.
+# GOOGLE_JWKS_SOURCE can be a URL or a path to a JWKS file (so tests can sign tokens with a local key pair)
+
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+JWKS_CACHE_KEY = "google_jwks"
+JWKS_REFETCH_KEY = "google_jwks_refetch"    # stops a flood of tokens with unknown key ids from refetching every time
+
+class GoogleTokenError(Exception):
+    pass
+
+def fetch_google_jwks():
+    """Loads the key set from GOOGLE_JWKS_SOURCE and caches it"""
+    source = settings.GOOGLE_JWKS_SOURCE
+    if source.startswith(("http://", "https://")):
+        resp = requests.get(source, timeout=settings.GOOGLE_JWKS_TIMEOUT)
+        resp.raise_for_status()
+        jwks = resp.json()
+    else:
+        with open(source) as f:
+            jwks = json.load(f)
+
+    cache.set(JWKS_CACHE_KEY, jwks, settings.GOOGLE_JWKS_CACHE_TTL)
+    return jwks
+
+def _find_key(jwks, kid):
+    for key in jwks.get("keys", []):
+        if key.get("kid") == kid:
+            return jwt.PyJWK(key).key
+    return None
+
+def verify_google_id_token(token):
+    """Checks the token's signature, issuer, expiry, audience and that its email is verified, returns its claims"""
+    # Without our client id any Google token, issued to whatever app, would pass
+    if not settings.GOOGLE_CLIENT_ID:
+        raise GoogleTokenError("GOOGLE_CLIENT_ID isn't set, Google login is disabled")
+
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except jwt.InvalidTokenError as e:
+        raise GoogleTokenError(f"Malformed token: {e}")
+
+    try:
+        jwks = cache.get(JWKS_CACHE_KEY) or fetch_google_jwks()
+        key = _find_key(jwks, kid)
+        if key is None and cache.add(JWKS_REFETCH_KEY, True, settings.GOOGLE_JWKS_REFETCH_COOLDOWN):
+            # Google rotated its keys before our refresh task caught it
+            key = _find_key(fetch_google_jwks(), kid)
+    except (requests.RequestException, OSError, ValueError, jwt.PyJWKError) as e:
+        raise GoogleTokenError(f"Could not load Google's signing keys: {e}")
+
+    if key is None:
+        raise GoogleTokenError("Unknown signing key")
+
+    try:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=settings.GOOGLE_CLIENT_ID,
+            issuer=GOOGLE_ISSUERS,
+            options={"verify_aud": True},
+            leeway=settings.GOOGLE_TOKEN_LEEWAY,
+        )
+    except jwt.InvalidTokenError as e:
+        raise GoogleTokenError(str(e))
+
+    # We match and create users by email, so it has to be one Google checked belongs to them
+    if claims.get("email_verified") is not True:
+        raise GoogleTokenError("Email not verified")
+    return claims
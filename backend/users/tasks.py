@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .google_auth import fetch_google_jwks
+
+@shared_task
+def refresh_google_jwks():
+    """Refreshes Google's signing keys before the cached copy expires, so logins never have to wait on Google"""
+    jwks = fetch_google_jwks()
+    return [key.get("kid") for key in jwks.get("keys", [])]
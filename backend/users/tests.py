@@ -1,3 +1,31 @@
-from django.test import TestCase
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from backend.query_budgets import QueryBudgetTestCase, PASSWORD
+
+# (max queries, max wall time in ms), see backend/query_budgets.py
+BUDGETS = {
+    "token": (2, 1500),                 # lookup + last_login, the rest is password hashing
+    "token_refresh": (1, 200),
+    "logout": (1, 100),
+    "me": (1, 100),
+    "register": (2, 1500),              # unique email check + insert, plus hashing
+}
+
+class UserEndpointBudgetTests(QueryBudgetTestCase):
+    def test_token(self):
+        self.assertWithinBudget(BUDGETS["token"], "post", "/api/auth/token/", {"email": self.user.email, "password": PASSWORD})
+
+    def test_token_refresh(self):
+        client = Client()
+        client.cookies["refresh_token"] = str(RefreshToken.for_user(self.user))
+        self.assertWithinBudget(BUDGETS["token_refresh"], "post", "/api/auth/token/refresh/", {}, client=client)
+
+    def test_logout(self):
+        self.assertWithinBudget(BUDGETS["logout"], "post", "/api/auth/logout/", {}, **self.auth())
+
+    def test_me(self):
+        self.assertWithinBudget(BUDGETS["me"], "get", "/api/me/", **self.auth())
+
+    def test_register(self):
+        self.assertWithinBudget(BUDGETS["register"], "post", "/api/auth/register/", {"email": "new_user@example.com", "password": PASSWORD})
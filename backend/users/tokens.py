@@ -6,6 +6,9 @@ from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
 from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
 
 class CookieTokenRefreshView(TokenRefreshView):
     """
@@ -41,7 +44,7 @@ class CookieTokenRefreshView(TokenRefreshView):
                 )
                 # Remove refresh token from response body (it's in cookie now)
                 del response.data['refresh']
-            print("ok!")
+            logger.debug("refreshed token", extra={"event": "token_refresh"})
             return response
             
         except InvalidToken as e:
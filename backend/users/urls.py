@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.urls import path
 from .views import register, me, google_login, logout
 from .tokens import CookieTokenRefreshView
 from users.views import email_token_obtain_pair
 from projects import views as project_views 
+from projects import async_views as project_async_views
 
 urlpatterns = [
     # JWT token obtain (email + password) and refresh
@@ -14,9 +16,9 @@ urlpatterns = [
     path("auth/google/", google_login, name="google_login"),
 
     # Validates the token when a guest clicks the link
-    path('validate-share-link/', project_views.validate_share_link, name='validate_share_link'),
+    path('validate-share-link/', project_async_views.avalidate_share_link if settings.ASYNC_API_VIEWS else project_views.validate_share_link, name='validate_share_link'),
     # Public read-only snippet content
-    path('public/snippet/<str:token>/', project_views.get_snippet_content, name='get_snippet_content'),
+    path('public/snippet/<str:token>/', project_async_views.aget_snippet_content if settings.ASYNC_API_VIEWS else project_views.get_snippet_content, name='get_snippet_content'),
 
     # others
     path("auth/register/", register, name="register"),
@@ -1,4 +1,4 @@
-import requests
+import logging
 from django.contrib.auth import get_user_model
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -6,10 +6,12 @@ from rest_framework.response import Response
 from rest_framework import status
 from .serializers import RegisterSerializer, UserSerializer
 from .tokens import EmailTokenObtainPairSerializer
+from .google_auth import verify_google_id_token, GoogleTokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils import timezone
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 @api_view(["POST"])
@@ -20,11 +22,13 @@ def google_login(request):
     if not token:
         return Response({"error": "Missing Google token"}, status=status.HTTP_400_BAD_REQUEST)
 
-    google_resp = requests.get(f"https://oauth2.googleapis.com/tokeninfo?id_token={token}", timeout=10)
-    if google_resp.status_code != 200:
+    # Verified locally against Google's cached signing keys, no request to Google per login
+    try:
+        google_data = verify_google_id_token(token)
+    except GoogleTokenError as e:
+        logger.info("google token rejected", extra={"event": "google_token_rejected", "error": str(e)})
         return Response({"error": "Invalid Google token"}, status=status.HTTP_400_BAD_REQUEST)
 
-    google_data = google_resp.json()
     email = google_data.get("email")
     if not email:
         return Response({"error": "Email not available"}, status=status.HTTP_400_BAD_REQUEST)
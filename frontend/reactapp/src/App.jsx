@@ -40,6 +40,8 @@ function App() {
         <Route path="/snippet/:token" element={<OfflinePlayground />} />
         {/* Shared Project Join Route - Accessible without login */}
         <Route path="/join-shared/:token" element={<SharedProjectHandler />} />
+        {/* Read-only live view of a session (broadcast links) */}
+        <Route path="/view/:token" element={<SharedProjectHandler />} />
         {/* Shared IDE Route - For anonymous users joining via share link */}
         <Route path="/shared-ide" element={<PyIDE />} />
 
@@ -1,9 +1,9 @@
 import { useState } from "react";
-import { X, Copy, Check, Link, FileCode, Users } from "lucide-react";
+import { X, Copy, Check, Link, FileCode, Users, Eye } from "lucide-react";
 import api from "../../../axiosConfig";
 
 export const ShareModal = ({ isOpen, onClose, group, project }) => {
-  const [activeTab, setActiveTab] = useState("edit"); // 'edit' or 'snippet'
+  const [activeTab, setActiveTab] = useState("edit"); // 'edit', 'view' or 'snippet'
   const [generatedLink, setGeneratedLink] = useState("");
   const [loading, setLoading] = useState(false);
   const [copied, setCopied] = useState(false);
@@ -19,14 +19,16 @@ export const ShareModal = ({ isOpen, onClose, group, project }) => {
       let endpoint = "";
       if (type === 'edit') {
         endpoint = `/groups/${group.id}/projects/${project.id}/share/`;
+      } else if (type === 'view') {
+        endpoint = `/groups/${group.id}/projects/${project.id}/share-view/`;
       } else {
         endpoint = `/groups/${group.id}/projects/${project.id}/share-snippet/`;
       }
 
       const res = await api.get(endpoint);
       
-      // Backend returns { share_url: "..." } or { snippet_url: "..." }
-      setGeneratedLink(res.data.share_url || res.data.snippet_url);
+      // Backend returns { share_url: "..." }, { view_url: "..." } or { snippet_url: "..." }
+      setGeneratedLink(res.data.share_url || res.data.view_url || res.data.snippet_url);
     } catch (err) {
       console.error(err);
       alert("Failed to generate link");
@@ -67,6 +69,14 @@ export const ShareModal = ({ isOpen, onClose, group, project }) => {
           >
             <Users className="h-4 w-4" /> Collaborate (Edit)
           </button>
+          <button 
+            onClick={() => { setActiveTab("view"); setGeneratedLink(""); }}
+            className={`flex-1 py-3 text-sm font-medium flex items-center justify-center gap-2 transition-colors ${
+              activeTab === "view" ? "text-purple-400 border-b-2 border-purple-400 bg-purple-500/5" : "text-gray-400 hover:text-gray-200"
+            }`}
+          >
+            <Eye className="h-4 w-4" /> Broadcast (View)
+          </button>
           <button 
             onClick={() => { setActiveTab("snippet"); setGeneratedLink(""); }}
             className={`flex-1 py-3 text-sm font-medium flex items-center justify-center gap-2 transition-colors ${
@@ -81,11 +91,13 @@ export const ShareModal = ({ isOpen, onClose, group, project }) => {
         <div className="p-6">
           <div className="mb-6">
             <h4 className="text-sm font-medium text-white mb-2">
-              {activeTab === "edit" ? "Invite Editors" : "Share Read-Only Copy"}
+              {activeTab === "edit" ? "Invite Editors" : activeTab === "view" ? "Broadcast to Viewers" : "Share Read-Only Copy"}
             </h4>
             <p className="text-xs text-gray-400 leading-relaxed">
               {activeTab === "edit" 
                 ? "Anyone with this link can join the session and edit code in real-time. They must be logged in to PyTogether."
+                : activeTab === "view"
+                ? "Anyone with this link can watch the code change live, no login needed. They cannot edit and don't show up in the session, great for a class."
                 : "Anyone with this link can view a copy of your code in the Offline Playground. They cannot edit your original project."
               }
             </p>
@@ -98,6 +110,8 @@ export const ShareModal = ({ isOpen, onClose, group, project }) => {
               className={`w-full py-2.5 rounded-lg text-sm font-bold text-white transition-all ${
                 activeTab === "edit" 
                   ? "bg-blue-600 hover:bg-blue-500 shadow-lg shadow-blue-500/20" 
+                  : activeTab === "view"
+                  ? "bg-purple-600 hover:bg-purple-500 shadow-lg shadow-purple-500/20"
                   : "bg-green-600 hover:bg-green-500 shadow-lg shadow-green-500/20"
               }`}
             >
@@ -24,7 +24,8 @@ export default function SharedProjectHandler() {
                     groupId: res.data.group_id,
                     projectId: res.data.project_id,
                     projectName: res.data.project_name,
-                    shareToken: token 
+                    shareToken: token,
+                    readOnly: res.data.read_only // broadcast links, the server only sends this connection the doc
                 },
                 replace: true
             });
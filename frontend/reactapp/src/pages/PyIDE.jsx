@@ -82,6 +82,10 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
   const [latency, setLatency] = useState(null);
   const [showShareModal, setShowShareModal] = useState(false);
   const [editorCrashed, setEditorCrashed] = useState(false);
+  // Read-only viewers show the saved code as plain text until the room has a ydoc (see 'initial' below)
+  const [viewerText, setViewerText] = useState(null);
+  // Set when the server sends us to the node that owns this room ({ node, url })
+  const [roomNode, setRoomNode] = useState(null);
 
   // Refs
   const ydocRef = useRef(null);
@@ -113,6 +117,8 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
   
   // Get shareToken from location state (if joining via link)
   const shareToken = location.state?.shareToken;
+  // Broadcast (view) links: the server only sends us the doc and ignores anything we'd send
+  const readOnly = !!location.state?.readOnly;
 
   // Language selection state
   const [language, setLanguage] = useState("python");
@@ -261,9 +267,13 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
     if (shareToken) {
       params.append('share_token', shareToken);
     }
+    if (roomNode) {
+      // Lets the proxy route us to the owner, and tells the server we were already redirected once
+      params.append('node', roomNode.node);
+    }
     const tokenParam = params.toString() ? `?${params.toString()}` : '';
 
-    const wsUrl = `${wsBase}/ws/groups/${groupId}/projects/${projectId}/code/${tokenParam}`;
+    const wsUrl = `${roomNode?.url || wsBase}/ws/groups/${groupId}/projects/${projectId}/code/${tokenParam}`;
     const ws = new WebSocket(wsUrl);
     wsRef.current = ws;
 
@@ -278,6 +288,7 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
       console.log('WebSocket connected');
       setIsConnected(true);
       ws.send(JSON.stringify({ type: 'request_sync' }));
+      if (readOnly) return;
 
       // FAKE UPDATE TRIGGER
       setTimeout(() => {
@@ -295,6 +306,7 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
     };
 
     let isDocInitialized = false;
+    let redirectTo = null;
 
     ws.onmessage = (event) => {
       try {
@@ -324,12 +336,25 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
             } catch(e) { console.error("Failed to apply Yjs update", e); }
             break;
 
+          case 'updates':
+            // Batched updates, what read-only viewers get instead of 'update'
+            if (!isDocInitialized) break;
+            try {
+              ydoc.transact(() => {
+                for (const updateB64 of data.updates_b64) {
+                  Y.applyUpdate(ydoc, Uint8Array.from(atob(updateB64), c => c.charCodeAt(0)), 'server');
+                }
+              }, 'server');
+            } catch(e) { console.error("Failed to apply Yjs updates", e); }
+            break;
+
           case 'sync': {
             // Full document sync
             const stateBytes = Uint8Array.from(atob(data.ydoc_b64), c => c.charCodeAt(0));
             Y.applyUpdate(ydoc, stateBytes, 'server');
             //console.log("ydoc made:", ytext.toString());
             isDocInitialized = true;
+            setViewerText(null);
             
             // Check if editor crashed by comparing ytext to actual editor
             setTimeout(() => {
@@ -381,6 +406,13 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
             console.log("INITIAL")
             // Initial content from db
             console.log('Received initial content from server');
+            if (readOnly) {
+              // Nobody has started the room's ydoc yet. Putting the text in ours would show it twice once the
+              // editor's doc arrives, so just display it, the server sends us a 'sync' as soon as there is a doc
+              setViewerText(data.content || '');
+              setCode(data.content || '');
+              break;
+            }
             ydoc.transact(() => {
               ytext.delete(0, ytext.length);
               ytext.insert(0, data.content || '');
@@ -409,6 +441,11 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
             break;
           }
             
+          case 'redirect':
+            // Another server owns this room, the socket gets closed with 4010 right after
+            redirectTo = { node: data.node, url: data.url };
+            break;
+
           case 'voice_room_update':
             voice.setParticipants(data.participants || []);
             break;
@@ -438,6 +475,11 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
     ws.onclose = (event) => { 
         console.log('Disconnected.');
         awareness.setLocalState(null);
+        if (event.code === 4010 && redirectTo) {
+            // Reconnects through the effect below with a fresh doc
+            setRoomNode(redirectTo);
+            return;
+        }
         if (event.code === 4000) {
             alert("You have been disconnected due to a server update. All your work has been saved.");
         }
@@ -449,7 +491,7 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
     // Outgoing Updates (Client -> Server)
     const updateHandler = (update, origin) => {
       // Don't send updates that came from the server
-      if (origin !== 'server' && ws.readyState === WebSocket.OPEN) {
+      if (origin !== 'server' && !readOnly && ws.readyState === WebSocket.OPEN) {
          if (origin !== 'remote') runner.errorLine && runner.setErrorLine(null); // Clear error on typing
          const updateB64 = btoa(String.fromCharCode.apply(null, update));
          ws.send(JSON.stringify({ type: 'update', update_b64: updateB64 }));
@@ -459,6 +501,7 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
 
     // Outgoing Awareness
     const awarenessHandler = ({ added, updated, removed }) => {
+      if (readOnly) return;
       const clients = [...added, ...updated, ...removed];
       const update = encodeAwarenessUpdate(awareness, clients);
       const updateB64 = btoa(String.fromCharCode.apply(null, update));
@@ -487,7 +530,7 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
       codeUndoManager.destroy();
       awareness.destroy();
     };
-  }, [groupId, projectId]);
+  }, [groupId, projectId, roomNode]);
 
 
   // ACTIONS
@@ -648,12 +691,22 @@ export default function PyIDE({ groupId: propGroupId, projectId: propProjectId,
             </div>
           </div>
         </div>
+      ) : isConnected && viewerText !== null ? (
+        <CodeMirror
+          height="100%"
+          className="h-full text-sm"
+          theme={oneDark}
+          readOnly
+          value={viewerText}
+          extensions={[languageExtension]}
+        />
       ) : isConnected && ytextRef.current && awarenessRef.current ? (
         <>
           <CodeMirror
             height="100%"
             className="h-full text-sm"
             theme={oneDark}
+            readOnly={readOnly}
             extensions={[
               languageExtension,
               yCollab(ytextRef.current, awarenessRef.current, { undoManager: codeUndoManagerRef.current }),